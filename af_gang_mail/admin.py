@@ -27,12 +27,30 @@ class UserAdmin(auth.admin.UserAdmin):
     )
 
 
+@admin.register(models.DailyRollup)
+class DailyRollupAdmin(admin.ModelAdmin):
+    list_display = ["date", "exchange", "country", "users", "confirmed", "sent"]
+    list_filter = ["exchange", "date"]
+
+
 @admin.register(models.Draw)
 class DrawAdmin(admin.ModelAdmin):
     list_display = ["sender", "recipient", "exchange"]
     list_filter = ["exchange"]
 
 
+@admin.register(models.DrawRun)
+class DrawRunAdmin(admin.ModelAdmin):
+    list_display = ["exchange", "started", "engine", "seed", "score", "draw_seconds"]
+    list_filter = ["exchange"]
+
+
+@admin.register(models.EmailSend)
+class EmailSendAdmin(admin.ModelAdmin):
+    list_display = ["user", "exchange", "kind", "status", "attempts", "sent"]
+    list_filter = ["exchange", "kind", "status"]
+
+
 @admin.register(models.Exchange)
 class ExchangeAdmin(admin.ModelAdmin):
     list_display = ["name", "drawn", "sent"]
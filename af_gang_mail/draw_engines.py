@@ -0,0 +1,532 @@
+"""
+Draw engines.
+
+A draw engine arranges the participants in an exchange into a single cycle, in which
+each participant sends mail to the next participant in the cycle. Engines work with
+user IDs and a set of (sender ID, recipient ID) pairs from previous draws, and return
+the best cycle they found along with its score.
+
+The score of a cycle is the number of sender-recipient pairs it repeats from previous
+draws. The lower the score, the better. Zero is a perfect score.
+
+Cycles are returned as arrays of 64-bit integers, and engines only hold on to the best
+cycle they've found, so that large draws stay within a worker's memory limit.
+"""
+
+import logging
+import random
+from array import array
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from time import perf_counter
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+import billiard
+
+logger = logging.getLogger(__name__)
+
+
+def get_engine_class(path=None):
+    """Get a draw engine class from its path, or the one configured in settings."""
+
+    return import_string(path or settings.DRAW_ENGINE)
+
+
+def get_engine_path(engine_class):
+    return f"{ engine_class.__module__ }.{ engine_class.__qualname__ }"
+
+
+def new_seed():
+    """Get a new random seed for a draw."""
+
+    return random.SystemRandom().randrange(2 ** 63)
+
+
+def cycle_pairs(cycle):
+    """Get the sender-recipient pairs in a cycle."""
+
+    for i in range(-1, len(cycle) - 1):
+        yield (cycle[i], cycle[i + 1])
+
+
+def score_cycle(cycle, previous_pairs):
+    """Count the sender-recipient pairs in a cycle which are in previous_pairs."""
+
+    return sum(1 for pair in cycle_pairs(cycle) if pair in previous_pairs)
+
+
+class CycleScorer:
+    """
+    Score a cycle, and changes to it, incrementally.
+
+    The cycle is held as links between senders and recipients, and the senders in
+    repeated pairs are tracked. A move is described by the pairs it removes from the
+    cycle and the pairs it adds, so the change in score from a move can be evaluated,
+    and the move applied, by looking only at the three or four pairs it changes.
+
+    Two moves are supported: swapping two participants and moving a participant to
+    another point in the cycle. Reversing a segment of the cycle isn't supported, as
+    pairs are directed and reversing a segment changes every pair inside it.
+    """
+
+    def __init__(self, cycle, previous_pairs):
+        self.previous_pairs = previous_pairs
+        self.recipients = {}
+        self.senders = {}
+        for sender_id, recipient_id in cycle_pairs(cycle):
+            self.recipients[sender_id] = recipient_id
+            self.senders[recipient_id] = sender_id
+
+        self.repeated_senders = {
+            sender_id
+            for sender_id, recipient_id in self.recipients.items()
+            if (sender_id, recipient_id) in previous_pairs
+        }
+
+    @property
+    def score(self):
+        return len(self.repeated_senders)
+
+    def cycle(self):
+        """Get the cycle as a list of user IDs."""
+
+        if not self.recipients:
+            return []
+
+        first = next(iter(self.recipients))
+        cycle = [first]
+        user_id = self.recipients[first]
+        while user_id != first:
+            cycle.append(user_id)
+            user_id = self.recipients[user_id]
+
+        return cycle
+
+    def swap(self, first, second):
+        """Get the pairs removed and added by swapping two participants."""
+
+        if self.recipients[second] == first:
+            first, second = second, first
+
+        before_first, after_second = self.senders[first], self.recipients[second]
+        if self.recipients[first] == second:
+            return (
+                [(before_first, first), (first, second), (second, after_second)],
+                [(before_first, second), (second, first), (first, after_second)],
+            )
+
+        after_first, before_second = self.recipients[first], self.senders[second]
+        return (
+            [
+                (before_first, first),
+                (first, after_first),
+                (before_second, second),
+                (second, after_second),
+            ],
+            [
+                (before_first, second),
+                (second, after_first),
+                (before_second, first),
+                (first, after_second),
+            ],
+        )
+
+    def relocate(self, moved, target):
+        """Get the pairs removed and added by moving a participant after target."""
+
+        before_moved, after_moved, after_target = (
+            self.senders[moved],
+            self.recipients[moved],
+            self.recipients[target],
+        )
+        return (
+            [(before_moved, moved), (moved, after_moved), (target, after_target)],
+            [(before_moved, after_moved), (target, moved), (moved, after_target)],
+        )
+
+    def delta(self, move):
+        """Get the change in score a move would make."""
+
+        removed, added = move
+        return sum(1 for pair in added if pair in self.previous_pairs) - sum(
+            1 for pair in removed if pair in self.previous_pairs
+        )
+
+    def apply(self, move):
+        """Apply a move."""
+
+        removed, added = move
+
+        # Every sender in a removed pair is the sender in an added pair.
+        for sender_id, _ in removed:
+            self.repeated_senders.discard(sender_id)
+
+        for sender_id, recipient_id in added:
+            self.recipients[sender_id] = recipient_id
+            self.senders[recipient_id] = sender_id
+            if (sender_id, recipient_id) in self.previous_pairs:
+                self.repeated_senders.add(sender_id)
+
+
+class DrawEngine:
+    """
+    Base draw engine.
+
+    Engines make their random choices with their own random number generator, so a
+    draw with the same seed, participants and previous pairs can be replayed exactly.
+
+    The score and duration of each attempt in the last draw are kept in attempts.
+
+    If stop_event is given, engines stop making attempts once it's set.
+
+    A draw can be resumed from an initial cycle, such as a checkpoint from an earlier
+    draw, which is used as the best cycle until a better one is found.
+    """
+
+    def __init__(self, previous_pairs, seed=None, stop_event=None):
+        self.previous_pairs = previous_pairs
+        self.random = random.Random(seed)
+        self.stop_event = stop_event
+        self.attempts = []
+        self.initial_cycle = None
+
+    def stopped(self):
+        return self.stop_event is not None and self.stop_event.is_set()
+
+    def attempt(self, user_ids):
+        """
+        Make one attempt at arranging user IDs into a cycle.
+
+        Returns a tuple of the cycle, as an array of user IDs, and its score.
+        """
+
+        raise NotImplementedError()
+
+    def draw(self, user_ids, max_attempts, initial_cycle=None, on_improvement=None):
+        """
+        Arrange user IDs into a cycle.
+
+        Attempts are made until a perfect cycle is found, up to max_attempts. If
+        on_improvement is given, it's called with each cycle which is better than the
+        best so far, and its score.
+
+        Returns a tuple of the best cycle, as an array of user IDs, and its score.
+        """
+
+        self.attempts = []
+        self.initial_cycle = initial_cycle
+        best = None
+        if initial_cycle is not None:
+            best = (
+                array("q", initial_cycle),
+                score_cycle(initial_cycle, self.previous_pairs),
+            )
+            logger.info("Resuming from a cycle with score %d.", best[1])
+            if best[1] == 0:
+                return best
+
+        for _ in range(max_attempts):
+            start = perf_counter()
+            cycle, score = self.attempt(user_ids)
+            self.attempts.append((score, perf_counter() - start))
+            logger.info("Cycle scored %d (higher is worse; zero is perfect).", score)
+
+            if best is None or score < best[1]:
+                best = (cycle, score)
+                if on_improvement:
+                    on_improvement(cycle, score)
+
+            if score == 0:
+                logger.info("Got a perfect result!")
+                break
+
+            if self.stopped():
+                logger.info("Stopped.")
+                break
+
+        return best
+
+
+class ShuffleEngine(DrawEngine):
+    """
+    Shuffle participants until a perfect cycle is found.
+
+    If no perfect cycle is found within max_attempts, the best cycle is used.
+    """
+
+    def attempt(self, user_ids):
+        cycle = array("q", user_ids)
+        self.random.shuffle(cycle)
+        return (cycle, score_cycle(cycle, self.previous_pairs))
+
+
+class CycleEngine(DrawEngine):
+    """
+    Build a cycle which steers around previous pairs, then repair any repeats.
+
+    The cycle is built by walking from a random participant to a random participant
+    who hasn't been visited and who they haven't sent to before. If every remaining
+    participant would be a repeat, the walk takes a repeat and carries on.
+
+    Any repeats left in the cycle are repaired by a local search which evaluates each
+    move by the change it makes to the score, rather than by rescoring the cycle.
+
+    Each attempt builds and repairs a new cycle. In all but the most constrained draws
+    the first attempt will be perfect. When resuming from an initial cycle, the first
+    attempt carries on repairing it instead.
+    """
+
+    repair_moves = 100000
+
+    def __init__(self, previous_pairs, seed=None, stop_event=None):
+        super().__init__(previous_pairs, seed=seed, stop_event=stop_event)
+
+        self.previous_recipients = defaultdict(set)
+        for sender_id, recipient_id in previous_pairs:
+            self.previous_recipients[sender_id].add(recipient_id)
+
+    def _pick_recipient(self, sender_id, remaining):
+        """Pick the index of a recipient in remaining who sender_id hasn't sent to."""
+
+        previous_recipients = self.previous_recipients.get(sender_id)
+        if not previous_recipients:
+            return self.random.randrange(len(remaining))
+
+        # Most participants have only a handful of previous recipients, so a few
+        # random picks will almost always find one who isn't a repeat.
+        for _ in range(len(previous_recipients) + 1):
+            i = self.random.randrange(len(remaining))
+            if remaining[i] not in previous_recipients:
+                return i
+
+        candidates = [
+            i
+            for i, recipient_id in enumerate(remaining)
+            if recipient_id not in previous_recipients
+        ]
+        if candidates:
+            return self.random.choice(candidates)
+
+        return self.random.randrange(len(remaining))
+
+    def _build(self, user_ids):
+        """Build a cycle."""
+
+        remaining = list(user_ids)
+        if not remaining:
+            return []
+
+        cycle = []
+        i = self.random.randrange(len(remaining))
+        while True:
+            # Swap the picked participant to the end so removing them is cheap.
+            remaining[i], remaining[-1] = remaining[-1], remaining[i]
+            cycle.append(remaining.pop())
+            if not remaining:
+                return cycle
+
+            i = self._pick_recipient(cycle[-1], remaining)
+
+    def _repair(self, cycle):
+        """
+        Repair repeats in a cycle.
+
+        Each move takes the recipient in a random repeated pair and either swaps them
+        with a random participant or moves them to a random point in the cycle. Moves
+        which don't make the score worse are kept.
+        """
+
+        scorer = CycleScorer(cycle, self.previous_pairs)
+        if len(cycle) < 3:
+            return (cycle, scorer.score)
+
+        for _ in range(self.repair_moves):
+            if scorer.score == 0:
+                break
+
+            repeated = scorer.recipients[
+                self.random.choice(tuple(scorer.repeated_senders))
+            ]
+            other = self.random.choice(cycle)
+            if repeated == other:
+                continue
+
+            if self.random.random() < 0.5:
+                move = scorer.swap(repeated, other)
+            elif scorer.recipients[other] != repeated:
+                move = scorer.relocate(repeated, other)
+            else:
+                continue
+
+            if scorer.delta(move) <= 0:
+                scorer.apply(move)
+
+        return (scorer.cycle(), scorer.score)
+
+    def attempt(self, user_ids):
+        if self.initial_cycle is not None:
+            cycle, self.initial_cycle = list(self.initial_cycle), None
+        else:
+            cycle = self._build(user_ids)
+
+        cycle, score = self._repair(cycle)
+        return (array("q", cycle), score)
+
+
+# The engine and participants for a worker process in parallel_draw.
+_worker_draw = None  # pylint: disable=invalid-name
+
+
+def _init_worker(engine_class, previous_pairs, user_ids, stop_event):
+    global _worker_draw  # pylint: disable=global-statement,invalid-name
+    _worker_draw = (engine_class(previous_pairs, stop_event=stop_event), user_ids)
+
+
+def _draw_in_worker(max_attempts, seed, initial_cycle=None):
+    engine, user_ids = _worker_draw
+    engine.random.seed(seed)
+    cycle, score = engine.draw(user_ids, max_attempts, initial_cycle=initial_cycle)
+    return (cycle, score, engine.attempts)
+
+
+def parallel_draw(  # pylint: disable=too-many-arguments,too-many-locals
+    engine_class,
+    previous_pairs,
+    user_ids,
+    max_attempts,
+    processes,
+    seed=None,
+    initial_cycle=None,
+    on_improvement=None,
+):
+    """
+    Spread the attempts at a draw over a number of processes.
+
+    The previous pairs and participants are sent to each process once, when the
+    process starts. The attempts are split into chunks which are handed out to the
+    processes, each chunk seeded from seed. As soon as any chunk finds a perfect
+    cycle, all processes are told to stop and chunks which haven't started are
+    cancelled. If this process is interrupted, such as by a time limit, the processes
+    are terminated without waiting for the attempts they're making.
+
+    Processes are started with billiard, Celery's fork of multiprocessing, which lets
+    daemonic processes such as Celery's prefork workers start processes of their own.
+
+    If initial_cycle is given, the first chunk resumes from it. If on_improvement is
+    given, it's called with each chunk's cycle which is better than the best so far,
+    and its score.
+
+    Returns the best cycle found by any process, its score, and the score and duration
+    of each attempt made. The cycle and score are None if no chunk finished.
+    """
+
+    if seed is None:
+        seed = new_seed()
+
+    num_chunks = min(max_attempts, processes * 4)
+    chunks = [
+        max_attempts // num_chunks + (1 if i < max_attempts % num_chunks else 0)
+        for i in range(num_chunks)
+    ]
+
+    # Billiard copies its default context's members into its module at import.
+    context = billiard.get_context()  # pylint: disable=no-member
+    stop_event = context.Event()
+    best_cycle, best_score = None, None
+    attempts = []
+    with ProcessPoolExecutor(
+        max_workers=processes,
+        mp_context=context,
+        initializer=_init_worker,
+        initargs=(engine_class, previous_pairs, array("q", user_ids), stop_event),
+    ) as executor:
+        futures = [
+            executor.submit(
+                _draw_in_worker,
+                chunk_attempts,
+                f"{ seed }:{ i }",
+                initial_cycle if i == 0 else None,
+            )
+            for i, chunk_attempts in enumerate(chunks)
+        ]
+        try:
+            for future in as_completed(futures):
+                if future.cancelled():
+                    continue
+
+                cycle, score, chunk_attempts = future.result()
+                logger.info(
+                    "Chunk scored %d (higher is worse; zero is perfect).", score
+                )
+                attempts.extend(chunk_attempts)
+                if best_score is None or score < best_score:
+                    best_cycle, best_score = cycle, score
+                    if on_improvement:
+                        on_improvement(cycle, score)
+
+                if score == 0:
+                    logger.info("Got a perfect result! Stopping other processes.")
+                    _stop(stop_event, futures)
+
+        except BaseException:
+            logger.info("Interrupted. Terminating other processes.")
+            _stop(stop_event, futures)
+            _terminate(executor)
+            raise
+
+    return (best_cycle, best_score, attempts)
+
+
+def _stop(stop_event, futures):
+    stop_event.set()
+    for future in futures:
+        future.cancel()
+
+
+def _terminate(executor):
+    # Shutting down an executor waits for running attempts, which could take until
+    # the hard time limit, so its processes are killed instead.
+    processes = list(executor._processes.values())  # pylint: disable=protected-access
+    executor.shutdown(wait=False)
+    for process in processes:
+        process.terminate()
+
+
+def run_draw(  # pylint: disable=too-many-arguments
+    engine_class,
+    previous_pairs,
+    user_ids,
+    max_attempts,
+    processes=1,
+    seed=None,
+    initial_cycle=None,
+    on_improvement=None,
+):
+    """
+    Run a draw in this process, or spread over a number of processes.
+
+    Returns the best cycle, its score, and the score and duration of each attempt.
+    """
+
+    if processes > 1:
+        return parallel_draw(
+            engine_class,
+            previous_pairs,
+            user_ids,
+            max_attempts,
+            processes,
+            seed=seed,
+            initial_cycle=initial_cycle,
+            on_improvement=on_improvement,
+        )
+
+    engine = engine_class(previous_pairs, seed=seed)
+    cycle, score = engine.draw(
+        user_ids,
+        max_attempts,
+        initial_cycle=initial_cycle,
+        on_improvement=on_improvement,
+    )
+    return (cycle, score, engine.attempts)
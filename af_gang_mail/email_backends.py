@@ -0,0 +1,63 @@
+"""Email backends."""
+
+from anymail.backends import sendinblue
+from anymail.message import AnymailRecipientStatus
+
+
+# Anymail's SendinBlue payload sets recipients all at once with set_recipients, so
+# add_recipient is never called.
+class SendinBluePayload(  # pylint: disable=abstract-method
+    sendinblue.SendinBluePayload
+):
+    """
+    SendinBlue payload which supports merge_data.
+
+    Anymail doesn't support merge_data for SendinBlue, so it's sent as SendinBlue
+    message versions, one for each recipient, with their merge data added to the
+    message's params. The whole batch is sent in one API call.
+    """
+
+    def __init__(self, message, defaults, backend, *args, **kwargs):
+        # The message's attributes, including merge_data, are set while the payload
+        # is initialised.
+        self.merge_data = None
+        super().__init__(message, defaults, backend, *args, **kwargs)
+
+    def set_merge_data(self, merge_data):
+        self.merge_data = merge_data
+
+    def serialize_data(self):
+        if self.merge_data is not None:
+            params = self.data.pop("params", {})
+            self.data["messageVersions"] = [
+                {
+                    "to": [recipient],
+                    "params": {**params, **self.merge_data.get(recipient["email"], {})},
+                }
+                for recipient in self.data.pop("to", [])
+            ]
+
+        return super().serialize_data()
+
+
+class SendinBlueEmailBackend(sendinblue.EmailBackend):
+    """SendinBlue email backend which supports merge_data."""
+
+    def build_message_payload(self, message, defaults):
+        return SendinBluePayload(message, defaults, self)
+
+    def parse_recipient_status(self, response, payload, message):
+        if payload.merge_data is None:
+            return super().parse_recipient_status(response, payload, message)
+
+        # Batches get a message ID for each message version, in order.
+        message_ids = self.deserialize_json_response(response, payload, message).get(
+            "messageIds", []
+        )
+        return {
+            recipient.addr_spec: AnymailRecipientStatus(
+                message_id=message_ids[i] if i < len(message_ids) else None,
+                status="queued",
+            )
+            for i, recipient in enumerate(payload.all_recipients)
+        }
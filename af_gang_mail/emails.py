@@ -0,0 +1,104 @@
+"""
+Email rendering.
+
+Each kind of email is rendered from a subject template, a plain text body template
+and an HTML body template. Context which is the same for everyone in an exchange,
+like the site and the exchange's URLs, is kept apart from the context for each
+recipient so it only needs to be computed once per exchange.
+"""
+
+from django import urls
+from django.conf import settings
+from django.contrib.sites.models import Site
+from django.core.mail import EmailMultiAlternatives
+from django.template import loader
+
+
+def get_exchange_context_data(exchange, site=None):
+    """Get context data shared by every email about an exchange."""
+
+    if site is None:
+        site = Site.objects.get_current()
+
+    scheme = "https" if settings.SECURE_SSL_REDIRECT else "http"
+    base_url = f"{ scheme }://{ site.domain }"
+    return {
+        "exchange": exchange,
+        "site": site,
+        "exchange_url": base_url + urls.reverse("draw", kwargs={"slug": exchange.slug}),
+        "mark_as_sent_url": base_url
+        + urls.reverse("draw-sent", kwargs={"slug": exchange.slug}),
+        "mark_as_received_url": base_url
+        + urls.reverse("draw-received", kwargs={"slug": exchange.slug}),
+        "confirm_url": base_url
+        + urls.reverse("confirm_participation", kwargs={"slug": exchange.slug}),
+    }
+
+
+def get_exchange_merge_data(exchange, site=None):
+    """
+    Get merge data shared by every email about an exchange.
+
+    Used for emails which use templates on the email provider.
+    """
+
+    context = get_exchange_context_data(exchange, site=site)
+    return {
+        "exchange_name": exchange.name,
+        "site_name": context["site"].name,
+        "exchange_url": context["exchange_url"],
+        "mark_as_sent_url": context["mark_as_sent_url"],
+        "mark_as_received_url": context["mark_as_received_url"],
+        "confirm_url": context["confirm_url"],
+    }
+
+
+class EmailRenderer:
+    """
+    Render one kind of email.
+
+    Templates are loaded when the renderer is created and context data for each
+    exchange is computed the first time it's needed, so one renderer should be used
+    for every email of its kind in a task.
+    """
+
+    def __init__(self, template_name_prefix):
+        self.subject_template = loader.get_template(
+            f"{ template_name_prefix }-subject.txt"
+        )
+        self.body_text_template = loader.get_template(
+            f"{ template_name_prefix }-body.txt"
+        )
+        self.body_html_template = loader.get_template(
+            f"{ template_name_prefix }-body.html"
+        )
+        self.site = None
+        self.exchange_context_data = {}
+
+    def get_exchange_context_data(self, exchange):
+        """Get context data for emails about an exchange, computing it only once."""
+
+        if exchange.id not in self.exchange_context_data:
+            if self.site is None:
+                self.site = Site.objects.get_current()
+
+            self.exchange_context_data[exchange.id] = get_exchange_context_data(
+                exchange, site=self.site
+            )
+
+        return self.exchange_context_data[exchange.id]
+
+    def render(self, exchange, context, addresses, **kwargs):
+        """Render an email about exchange to a list of addresses."""
+
+        context = {**self.get_exchange_context_data(exchange), **context}
+        msg = EmailMultiAlternatives(
+            subject=self.subject_template.render(context),
+            body=self.body_text_template.render(context),
+            from_email=settings.DEFAULT_FROM_EMAIL,
+            to=addresses,
+            **kwargs,
+        )
+        msg.attach_alternative(self.body_html_template.render(context), "text/html")
+
+        return msg
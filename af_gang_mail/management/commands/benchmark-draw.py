@@ -0,0 +1,214 @@
+"""Benchmark drawing exchanges."""
+
+# pylint: disable=invalid-name
+
+import json
+import logging
+import random
+import tracemalloc
+from importlib import import_module
+from time import perf_counter
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.utils.timezone import now
+
+from allauth.account.models import EmailAddress
+
+from af_gang_mail import draw_engines, models
+
+# Reuse the factories for creating test exchanges.
+create_test_exchange = import_module(
+    "af_gang_mail.management.commands.create-test-exchange"
+)
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 1000
+
+
+class Command(BaseCommand):
+    """
+    Benchmark drawing exchanges.
+
+    Draws exchanges of each number of users with each number of past exchanges, and
+    writes a JSON object of results per draw. Everything created is rolled back.
+    """
+
+    help = __doc__
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--num-users",
+            type=int,
+            nargs="+",
+            default=[100, 1000, 10000, 100000],
+            help="Numbers of users to draw.",
+        )
+        parser.add_argument(
+            "--num-past-exchanges",
+            type=int,
+            nargs="+",
+            default=[0, 3, 10],
+            help="Numbers of past exchanges the users have taken part in.",
+        )
+        parser.add_argument(
+            "--max-attempts",
+            type=int,
+            default=settings.CREATE_DRAW_MAX_ATTEMPTS,
+            help="Maximum number of attempts per draw.",
+        )
+        parser.add_argument("--engine", help="Path of the draw engine to use.")
+        parser.add_argument(
+            "--processes",
+            type=int,
+            default=settings.CREATE_DRAW_PROCESSES,
+            help="Number of processes to draw with.",
+        )
+        parser.add_argument("--seed", type=int, help="Seed for each draw.")
+        parser.add_argument(
+            "--no-trace-memory",
+            action="store_false",
+            dest="trace_memory",
+            help="Don't measure peak memory, which slows down drawing.",
+        )
+        parser.add_argument(
+            "--output",
+            help="File to append results to, as JSON lines. Defaults to stdout.",
+        )
+
+    def _create_users(self, num_users, exchange):  # pylint: disable=no-self-use
+        """Create confirmed, eligible users in an exchange and return their IDs."""
+
+        prefix = f"benchmark-{ uuid4().hex }"
+        for start in range(0, num_users, BATCH_SIZE):
+            models.User.objects.bulk_create(
+                create_test_exchange.UserFactory.build(
+                    username=f"{ prefix }-{ i }", email=f"{ prefix }-{ i }@example.com"
+                )
+                for i in range(start, min(start + BATCH_SIZE, num_users))
+            )
+
+        user_ids = list(
+            models.User.objects.filter(username__startswith=prefix).values_list(
+                "id", flat=True
+            )
+        )
+        EmailAddress.objects.bulk_create(
+            (
+                EmailAddress(
+                    user_id=user_id,
+                    email=f"{ user_id }@example.com",
+                    verified=True,
+                    primary=True,
+                )
+                for user_id in user_ids
+            ),
+            batch_size=BATCH_SIZE,
+        )
+        models.UserInExchange.objects.bulk_create(
+            (
+                models.UserInExchange(
+                    user_id=user_id, exchange=exchange, confirmed=True
+                )
+                for user_id in user_ids
+            ),
+            batch_size=BATCH_SIZE,
+        )
+
+        return user_ids
+
+    def _create_past_exchanges(  # pylint: disable=no-self-use
+        self, num_past_exchanges, user_ids
+    ):
+        """Create past exchanges with a random draw between users."""
+
+        for _ in range(num_past_exchanges):
+            exchange = create_test_exchange.ExchangeFactory()
+            cycle = list(user_ids)
+            random.shuffle(cycle)
+            models.Draw.objects.bulk_create(
+                (
+                    models.Draw(
+                        sender_id=sender_id,
+                        recipient_id=recipient_id,
+                        exchange=exchange,
+                    )
+                    for sender_id, recipient_id in draw_engines.cycle_pairs(cycle)
+                ),
+                batch_size=BATCH_SIZE,
+            )
+
+    def _benchmark(self, num_users, num_past_exchanges, options):
+        """Benchmark a draw and return the results."""
+
+        exchange = create_test_exchange.ExchangeFactory()
+        logger.info("Creating %d users.", num_users)
+        user_ids = self._create_users(num_users, exchange)
+        logger.info("Creating %d past exchanges.", num_past_exchanges)
+        self._create_past_exchanges(num_past_exchanges, user_ids)
+
+        engine_class = draw_engines.get_engine_class(options["engine"])
+        logger.info("Drawing %d users.", num_users)
+        if options["trace_memory"]:
+            tracemalloc.start()
+
+        with CaptureQueriesContext(connection) as queries:
+            start = perf_counter()
+            models.Draw.objects.bulk_create_from_exchange(
+                exchange,
+                models.DrawOptions(
+                    max_attempts=options["max_attempts"],
+                    engine_class=engine_class,
+                    processes=options["processes"],
+                    seed=options["seed"],
+                ),
+            )
+            seconds = perf_counter() - start
+
+        peak_memory = None
+        if options["trace_memory"]:
+            _, peak_memory = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+        draw_run = exchange.draw_runs.get()
+        return {
+            "time": now().isoformat(),
+            "release": settings.SENTRY_RELEASE,
+            "engine": draw_run.engine,
+            "processes": draw_run.processes,
+            "seed": draw_run.seed,
+            "num_users": num_users,
+            "num_past_exchanges": num_past_exchanges,
+            "max_attempts": draw_run.max_attempts,
+            "attempts": len(draw_run.attempts),
+            "score": draw_run.score,
+            "queries": len(queries),
+            "seconds": seconds,
+            "load_seconds": draw_run.load_seconds,
+            "draw_seconds": draw_run.draw_seconds,
+            "peak_memory_bytes": peak_memory,
+        }
+
+    def handle(self, *args, **options):
+        """Handle a call to the command."""
+        # Set logging level.
+        # 0 = minimal output, 1 = normal output, 2 = verbose output, and
+        # 3 = very verbose output.
+        log_levels = (logging.ERROR, logging.WARNING, logging.INFO, logging.DEBUG)
+        logger.setLevel(log_levels[options["verbosity"]])
+
+        for num_users in options["num_users"]:
+            for num_past_exchanges in options["num_past_exchanges"]:
+                with transaction.atomic():
+                    result = self._benchmark(num_users, num_past_exchanges, options)
+                    transaction.set_rollback(True)
+
+                if options["output"]:
+                    with open(options["output"], "a") as output:
+                        output.write(json.dumps(result) + "\n")
+                else:
+                    self.stdout.write(json.dumps(result))
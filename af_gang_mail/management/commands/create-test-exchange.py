@@ -8,6 +8,7 @@ from datetime import timedelta
 
 from django.core.management.base import BaseCommand
 from django.db import transaction
+from django.utils import timezone
 
 import factory
 import faker
@@ -27,7 +28,7 @@ class ExchangeFactory(factory.django.DjangoModelFactory):
     """Fake exchange factory."""
 
     name = factory.Faker("word")
-    drawn = factory.Faker("date_time")
+    drawn = factory.Faker("date_time", tzinfo=timezone.utc)
     sent = factory.LazyAttribute(lambda self: self.drawn + timedelta(days=7))
     received = factory.LazyAttribute(lambda self: self.sent + timedelta(days=7))
 
@@ -0,0 +1,63 @@
+"""Replay a draw run."""
+
+# pylint: disable=invalid-name
+
+import logging
+from time import perf_counter
+
+from django.core.management.base import BaseCommand
+
+from af_gang_mail import draw_engines, models
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    """Replay a draw run."""
+
+    help = __doc__
+
+    def add_arguments(self, parser):
+        parser.add_argument("draw_run_id", type=int, help="ID of the draw run.")
+        parser.add_argument(
+            "--engine",
+            help="Path of the draw engine to replay with, instead of the original.",
+        )
+        parser.add_argument(
+            "--processes",
+            type=int,
+            help="Number of processes to replay with, instead of the original.",
+        )
+
+    def handle(self, *args, **options):
+        """Handle a call to the command."""
+        # Set logging level.
+        # 0 = minimal output, 1 = normal output, 2 = verbose output, and
+        # 3 = very verbose output.
+        log_levels = (logging.ERROR, logging.WARNING, logging.INFO, logging.DEBUG)
+        logger.setLevel(log_levels[options["verbosity"]])
+
+        draw_run = models.DrawRun.objects.get(id=options["draw_run_id"])
+        engine_class = draw_engines.get_engine_class(
+            options["engine"] or draw_run.engine
+        )
+        logger.info(
+            "Replaying draw of %d users for %s with seed %d.",
+            len(draw_run.participant_ids),
+            draw_run.exchange,
+            draw_run.seed,
+        )
+
+        start = perf_counter()
+        _, score, attempts = draw_run.replay(
+            engine_class=engine_class, processes=options["processes"]
+        )
+        seconds = perf_counter() - start
+
+        self.stdout.write(f"Engine: { draw_engines.get_engine_path(engine_class) }")
+        self.stdout.write(f"Original score: { draw_run.score }")
+        self.stdout.write(f"Replayed score: { score }")
+        self.stdout.write(f"Original attempts: { len(draw_run.attempts) }")
+        self.stdout.write(f"Replayed attempts: { len(attempts) }")
+        self.stdout.write(f"Original draw seconds: { draw_run.draw_seconds }")
+        self.stdout.write(f"Replayed seconds, including loading: { seconds }")
@@ -0,0 +1,66 @@
+"""Run the scheduler."""
+
+# pylint: disable=invalid-name
+
+import logging
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from django.utils.timezone import now
+
+from af_gang_mail import scheduler
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    """
+    Run the scheduler.
+
+    Enqueues due tasks, then sleeps until the next phase of an exchange is due and
+    does it again, until stopped. Can run alongside enqueue-tasks and other
+    schedulers.
+    """
+
+    help = __doc__
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--max-sleep",
+            type=float,
+            default=settings.SCHEDULER_MAX_SLEEP_SECONDS,
+            help="Longest to sleep between checks for due tasks, in seconds.",
+        )
+
+    def handle(self, *args, **options):
+        """Handle a call to the command."""
+        # Set logging level.
+        # 0 = minimal output, 1 = normal output, 2 = verbose output, and
+        # 3 = very verbose output.
+        log_levels = (logging.ERROR, logging.WARNING, logging.INFO, logging.DEBUG)
+        logger.setLevel(log_levels[options["verbosity"]])
+        logging.getLogger(scheduler.__name__).setLevel(log_levels[options["verbosity"]])
+
+        logger.info("Starting.")
+        try:
+            while True:
+                close_old_connections()
+                claimed = (
+                    scheduler.run()
+                    + scheduler.run_periodic()
+                    + scheduler.resume_draws()
+                )
+                if claimed:
+                    logger.info("Enqueued %d tasks.", len(claimed))
+
+                next_due = scheduler.next_due()
+                seconds = scheduler.seconds_until(next_due, now(), options["max_sleep"])
+                logger.debug(
+                    "Next due at %s. Sleeping for %f seconds.", next_due, seconds
+                )
+                time.sleep(seconds)
+
+        except KeyboardInterrupt:
+            logger.info("Stopping.")
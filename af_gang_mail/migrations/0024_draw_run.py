@@ -0,0 +1,56 @@
+# Generated by Django 3.1.6 on 2026-10-18 16:23
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("af_gang_mail", "0023_user_in_exchange"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DrawRun",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("engine", models.TextField()),
+                ("seed", models.BigIntegerField()),
+                ("processes", models.PositiveIntegerField(default=1)),
+                ("max_attempts", models.PositiveIntegerField()),
+                ("participant_ids", models.JSONField(default=list)),
+                (
+                    "attempts",
+                    models.JSONField(
+                        default=list,
+                        help_text="Score and duration in seconds of each attempt.",
+                    ),
+                ),
+                ("score", models.IntegerField(blank=True, null=True)),
+                ("load_seconds", models.FloatField(blank=True, null=True)),
+                ("draw_seconds", models.FloatField(blank=True, null=True)),
+                ("started", models.DateTimeField()),
+                ("finished", models.DateTimeField(blank=True, null=True)),
+                (
+                    "exchange",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="draw_runs",
+                        to="af_gang_mail.exchange",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["-started"],
+            },
+        ),
+    ]
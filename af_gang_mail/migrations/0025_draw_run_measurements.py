@@ -0,0 +1,23 @@
+# Generated by Django 3.1.6 on 2026-10-18 16:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("af_gang_mail", "0024_draw_run"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="drawrun",
+            name="num_participants",
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="drawrun",
+            name="num_previous_pairs",
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 3.1.6 on 2026-10-18 16:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("af_gang_mail", "0025_draw_run_measurements"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="drawrun",
+            name="best_cycle",
+            field=models.JSONField(
+                blank=True, help_text="Best cycle found so far, as user IDs.", null=True
+            ),
+        ),
+        migrations.AddField(
+            model_name="drawrun",
+            name="checkpointed",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="drawrun",
+            name="resumes",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="drawrun",
+            name="deadline",
+            field=models.DateTimeField(
+                blank=True,
+                help_text="When the task running the draw is killed by its time limit.",
+                null=True,
+            ),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 3.1.6 on 2026-10-18 16:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("af_gang_mail", "0026_draw_run_checkpoint"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="userinexchange",
+            index=models.Index(
+                condition=models.Q(confirmed=True),
+                fields=["exchange", "user"],
+                name="confirmed_users_in_exchange",
+            ),
+        ),
+    ]
@@ -0,0 +1,84 @@
+# Generated by Django 3.1.6 on 2026-10-18 16:33
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("af_gang_mail", "0027_confirmed_users_in_exchange_index"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="EmailSend",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("kind", models.TextField()),
+                (
+                    "status",
+                    models.TextField(
+                        choices=[
+                            ("pending", "Pending"),
+                            ("sending", "Sending"),
+                            ("sent", "Sent"),
+                            ("failed", "Failed"),
+                        ],
+                        default="pending",
+                    ),
+                ),
+                ("attempts", models.PositiveIntegerField(default=0)),
+                (
+                    "provider_id",
+                    models.TextField(
+                        blank=True,
+                        help_text="ID given to the email by the email provider.",
+                    ),
+                ),
+                ("error", models.TextField(blank=True)),
+                ("sent", models.DateTimeField(blank=True, null=True)),
+                ("created", models.DateTimeField(auto_now_add=True)),
+                ("updated", models.DateTimeField(auto_now=True)),
+                (
+                    "exchange",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="email_sends",
+                        to="af_gang_mail.exchange",
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="email_sends",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name="emailsend",
+            index=models.Index(
+                condition=models.Q(_negated=True, status="sent"),
+                fields=["exchange", "kind"],
+                name="unsent_emails",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="emailsend",
+            constraint=models.UniqueConstraint(
+                fields=("exchange", "user", "kind"), name="email_once_per_exchange"
+            ),
+        ),
+    ]
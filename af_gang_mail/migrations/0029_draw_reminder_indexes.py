@@ -0,0 +1,29 @@
+# Generated by Django 3.1.6 on 2026-10-18 16:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("af_gang_mail", "0028_email_send"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="draw",
+            index=models.Index(
+                condition=models.Q(sent__isnull=True),
+                fields=["exchange", "sender"],
+                name="unsent_draws",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="draw",
+            index=models.Index(
+                condition=models.Q(received__isnull=True),
+                fields=["exchange", "sender"],
+                name="unreceived_draws",
+            ),
+        ),
+    ]
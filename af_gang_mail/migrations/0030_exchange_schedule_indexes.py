@@ -0,0 +1,61 @@
+# Generated by Django 3.1.6 on 2026-10-18 16:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("af_gang_mail", "0029_draw_reminder_indexes"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="exchange",
+            index=models.Index(
+                condition=models.Q(confirmation_started__isnull=True),
+                fields=["confirmation"],
+                name="scheduled_for_confirmation",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="exchange",
+            index=models.Index(
+                condition=models.Q(confirmation_reminder_started__isnull=True),
+                fields=["confirmation_reminder"],
+                name="scheduled_for_conf_reminder",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="exchange",
+            index=models.Index(
+                condition=models.Q(draw_started__isnull=True),
+                fields=["drawn"],
+                name="scheduled_for_draw",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="exchange",
+            index=models.Index(
+                condition=models.Q(send_reminder_started__isnull=True),
+                fields=["sent"],
+                name="scheduled_for_send_reminder",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="exchange",
+            index=models.Index(
+                condition=models.Q(receive_reminder_started__isnull=True),
+                fields=["received"],
+                name="scheduled_for_recv_reminder",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="exchange",
+            index=models.Index(fields=["drawn", "sent"], name="exchange_drawn_sent"),
+        ),
+        migrations.AddIndex(
+            model_name="exchange",
+            index=models.Index(fields=["received"], name="exchange_received"),
+        ),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 3.1.6 on 2026-10-18 16:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("af_gang_mail", "0030_exchange_schedule_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="StatsSnapshot",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("users", models.PositiveIntegerField()),
+                (
+                    "percentages",
+                    models.JSONField(
+                        default=list,
+                        help_text="List of labels and percentages, in display order.",
+                    ),
+                ),
+                ("created", models.DateTimeField()),
+            ],
+            options={
+                "get_latest_by": "created",
+            },
+        ),
+        migrations.CreateModel(
+            name="PeriodicTaskClaim",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("name", models.TextField(unique=True)),
+                ("claimed", models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+    ]
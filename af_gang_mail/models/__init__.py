@@ -0,0 +1,28 @@
+"""Models."""
+
+from af_gang_mail.models.core import (
+    Draw,
+    DrawOptions,
+    DrawRun,
+    EmailSend,
+    Exchange,
+    PeriodicTaskClaim,
+    User,
+    UserInExchange,
+    UserManager,
+)
+from af_gang_mail.models.stats import DailyRollup, StatsSnapshot
+
+__all__ = [
+    "DailyRollup",
+    "Draw",
+    "DrawOptions",
+    "DrawRun",
+    "EmailSend",
+    "Exchange",
+    "PeriodicTaskClaim",
+    "StatsSnapshot",
+    "User",
+    "UserInExchange",
+    "UserManager",
+]
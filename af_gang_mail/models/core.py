@@ -0,0 +1,890 @@
+"""Models for users, exchanges, draws and emails."""
+
+import logging
+from collections import namedtuple
+from datetime import timedelta
+from itertools import islice
+from time import perf_counter
+
+from django.conf import settings
+from django.contrib import auth
+from django.core.exceptions import ValidationError
+from django.db import models, transaction
+from django.db.models import Exists, OuterRef, Q
+from django.utils.timezone import now
+
+from allauth.account.models import EmailAddress
+from autoslug import AutoSlugField
+from django_countries.fields import CountryField
+
+from af_gang_mail import draw_engines, emails
+
+logger = logging.getLogger(__name__)
+
+
+class UserManager(auth.models.UserManager):
+    """User manager."""
+
+    def eligible_for_draw(self):
+        return self.filter(emailaddress__verified=True, is_active=True).exclude(
+            Q(first_name="") & Q(last_name="")
+        )
+
+    def draw_participants(self, exchange):
+        """
+        Get users taking part in a draw for an exchange.
+
+        These are users who are eligible for a draw and have confirmed they're taking
+        part. Verified email addresses and confirmation are checked with EXISTS
+        subqueries, so users with more than one verified email address only appear
+        once.
+        """
+
+        return (
+            self.filter(is_active=True)
+            .exclude(Q(first_name="") & Q(last_name=""))
+            .filter(
+                Exists(EmailAddress.objects.filter(user=OuterRef("pk"), verified=True)),
+                Exists(
+                    UserInExchange.objects.filter(
+                        user=OuterRef("pk"), exchange=exchange, confirmed=True
+                    )
+                ),
+            )
+        )
+
+    def draw_participant_ids(self, exchange):
+        """Get the IDs of users taking part in a draw for an exchange, in order."""
+
+        return list(
+            self.draw_participants(exchange).order_by("id").values_list("id", flat=True)
+        )
+
+
+class User(auth.models.AbstractUser):
+    """User"""
+
+    address_line_1 = models.TextField("Address line 1", blank=True, null=False)
+    address_line_2 = models.TextField("Address line 2", blank=True, null=False)
+    address_city = models.TextField("City", blank=True, null=False)
+    address_state = models.TextField("State", blank=True, null=False)
+    address_postcode = models.TextField("Postcode", blank=True, null=False)
+    address_country = CountryField("Country", blank=True, null=False)
+    exchanges = models.ManyToManyField(
+        "Exchange", related_name="users", through="UserInExchange"
+    )
+
+    objects = UserManager()
+
+    def __str__(self):
+        """Full name or email address."""
+
+        if self.get_full_name():
+            return self.get_full_name()
+
+        if self.email:
+            return self.email
+
+        return super().__str__()
+
+    def get_address_parts(self):
+        """Get the parts of the address."""
+
+        address_parts = [
+            self.address_line_1,
+            self.address_line_2,
+            self.address_city,
+            self.address_state,
+            self.address_postcode,
+            self.address_country.name,
+        ]
+        return [part for part in address_parts if part]
+
+    def get_full_address(self):
+        return "\n".join(self.get_address_parts())
+
+    def has_short_address(self):
+        return len(self.get_address_parts()) < 3
+
+    def has_verified_email_address(self):
+        return self.emailaddress_set.filter(verified=True).exists()
+
+    class Meta:
+        permissions = [
+            ("statto", "Can view statto"),
+        ]
+
+
+class ExchangeManager(models.Manager):
+    """Exchange manager."""
+
+    @staticmethod
+    def get_upcoming_filter_kwargs():
+        return {"drawn__gt": now() + timedelta(minutes=1)}
+
+    def upcoming(self):
+        return self.filter(**self.get_upcoming_filter_kwargs())
+
+    def not_upcoming(self):
+        return self.filter(drawn__lt=now())
+
+    # Exchange dates are in order, so ordering by the date being filtered on keeps the
+    # default order while letting the filter's index return rows in that order.
+
+    def scheduled_for_confirmation(self):
+        return self.filter(
+            confirmation__lt=now(), confirmation_started__isnull=True
+        ).order_by("confirmation")
+
+    def scheduled_for_confirmation_reminder(self):
+        return self.filter(
+            confirmation_reminder__lt=now(), confirmation_reminder_started__isnull=True
+        ).order_by("confirmation_reminder")
+
+    def scheduled_for_draw(self):
+        return self.filter(drawn__lt=now(), draw_started__isnull=True)
+
+    def scheduled_for_send_reminder(self):
+        return self.filter(sent__lt=now(), send_reminder_started__isnull=True).order_by(
+            "sent"
+        )
+
+    def scheduled_for_receive_reminder(self):
+        return self.filter(
+            received__lt=now(), receive_reminder_started__isnull=True
+        ).order_by("received")
+
+    def drawn_not_sent(self):
+        return self.filter(drawn__lt=now(), sent__gt=now())
+
+    def past(self):
+        return self.filter(received__lt=now()).order_by("received")
+
+
+class Exchange(models.Model):
+    """Exchange"""
+
+    name = models.TextField(blank=False, null=False)
+    slug = AutoSlugField(populate_from="name", unique=True)
+    confirmation = models.DateTimeField(blank=False, null=True)
+    confirmation_reminder = models.DateTimeField(blank=False, null=True)
+    drawn = models.DateTimeField(blank=False, null=False)
+    sent = models.DateTimeField(blank=False, null=False)
+    received = models.DateTimeField(blank=False, null=False)
+    created = models.DateTimeField(auto_now_add=True)
+    updated = models.DateTimeField(auto_now=True)
+    confirmation_started = models.DateTimeField(blank=True, null=True)
+    confirmation_reminder_started = models.DateTimeField(blank=True, null=True)
+    draw_started = models.DateTimeField(blank=True, null=True)
+    send_reminder_started = models.DateTimeField(blank=True, null=True)
+    receive_reminder_started = models.DateTimeField(blank=True, null=True)
+    send_emails = models.BooleanField(default=False)
+
+    objects = ExchangeManager()
+
+    def __str__(self):
+        return self.name
+
+    def clean(self):
+        if (
+            not self.confirmation
+            < self.confirmation_reminder
+            < self.drawn
+            < self.sent
+            < self.received
+        ):
+            raise ValidationError("Exchange dates must be in order.")
+
+        return super().clean()
+
+    class Meta:
+        ordering = ["drawn"]
+        indexes = [
+            models.Index(
+                fields=["confirmation"],
+                condition=Q(confirmation_started__isnull=True),
+                name="scheduled_for_confirmation",
+            ),
+            models.Index(
+                fields=["confirmation_reminder"],
+                condition=Q(confirmation_reminder_started__isnull=True),
+                name="scheduled_for_conf_reminder",
+            ),
+            models.Index(
+                fields=["drawn"],
+                condition=Q(draw_started__isnull=True),
+                name="scheduled_for_draw",
+            ),
+            models.Index(
+                fields=["sent"],
+                condition=Q(send_reminder_started__isnull=True),
+                name="scheduled_for_send_reminder",
+            ),
+            models.Index(
+                fields=["received"],
+                condition=Q(receive_reminder_started__isnull=True),
+                name="scheduled_for_recv_reminder",
+            ),
+            models.Index(fields=["drawn", "sent"], name="exchange_drawn_sent"),
+            models.Index(fields=["received"], name="exchange_received"),
+        ]
+
+
+class UserInExchange(models.Model):
+    """User in exchange."""
+
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name="user_in_exchanges"
+    )
+    exchange = models.ForeignKey(
+        Exchange, on_delete=models.CASCADE, related_name="users_in_exchange"
+    )
+    confirmed = models.BooleanField(default=False, blank=False, null=False)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["exchange", "user"],
+                condition=Q(confirmed=True),
+                name="confirmed_users_in_exchange",
+            )
+        ]
+
+    email_templates = {
+        "confirmation": "af_gang_mail/confirmation-email",
+        "confirmation_reminder": "af_gang_mail/confirmation-reminder-email",
+    }
+
+    @property
+    def email_address(self):
+        return self.user.email
+
+    def get_email_merge_data(self, context=None):  # pylint: disable=unused-argument
+        """Get merge data for emails which use templates on the email provider."""
+
+        return {"name": self.user.get_full_name()}
+
+    def as_email_message(self, kind, renderer=None, context=None, **kwargs):
+        """
+        Construct an EmailMessage of a kind in email_templates.
+
+        Pass a renderer for the kind of email when constructing a number of messages.
+        """
+
+        if renderer is None:
+            renderer = emails.EmailRenderer(self.email_templates[kind])
+
+        if context is None:
+            context = {"user": self.user}
+
+        return renderer.render(self.exchange, context, [self.email_address], **kwargs)
+
+    def as_confirmation_email_message(self, **kwargs):
+        return self.as_email_message("confirmation", **kwargs)
+
+    def as_confirmation_reminder_email_message(self, **kwargs):
+        return self.as_email_message("confirmation_reminder", **kwargs)
+
+
+# How to run a draw: up to max_attempts attempts by engine_class, or the draw engine
+# configured in settings, spread over processes and seeded with seed, or a new random
+# seed.
+DrawOptions = namedtuple(
+    "DrawOptions",
+    ["max_attempts", "engine_class", "processes", "seed"],
+    defaults=[1000, None, 1, None],
+)
+
+
+class DrawManager(models.Manager):
+    """Draw manager."""
+
+    def _draws(self, exchange, cycle):  # pylint: disable=no-self-use
+        for sender_id, recipient_id in draw_engines.cycle_pairs(cycle):
+            yield Draw(
+                sender_id=sender_id, recipient_id=recipient_id, exchange=exchange
+            )
+
+    def previous_draws(self, user_ids, exchange, before=None):
+        """
+        Get previous draws between users.
+
+        user_ids can be a list of IDs or a queryset of IDs. Draws for exchange are
+        ignored, as are draws created after before, if it's given.
+        """
+
+        draws = self.filter(sender_id__in=user_ids, recipient_id__in=user_ids).exclude(
+            exchange=exchange
+        )
+        if before:
+            draws = draws.filter(created__lt=before)
+
+        return draws
+
+    def previous_pairs(self, user_ids, exchange, before=None):
+        """
+        Get sender-recipient pairs from previous draws between users.
+
+        These are loaded once per draw so that scoring an attempt is a set of
+        membership tests rather than a query per pair.
+        """
+
+        return set(
+            self.previous_draws(user_ids, exchange, before=before).values_list(
+                "sender_id", "recipient_id"
+            )
+        )
+
+    def bulk_create_from_exchange(self, exchange, options=None, draw_run=None):
+        """
+        Create draws for an exchange.
+
+        The draw is run with options, a DrawOptions, and recorded in a DrawRun so it
+        can be replayed. If draw_run is given, it's run instead, resuming from its
+        checkpoint if it has one.
+        """
+
+        logger.info("Preparing set of draws for %s.", exchange.name)
+        if draw_run is None:
+            draw_run = DrawRun.objects.prepare(exchange, options)
+
+        start = perf_counter()
+        user_ids = User.objects.draw_participant_ids(exchange)
+        logger.info("%d users.", len(user_ids))
+
+        logger.info("Loading previous sender-recipient pairs.")
+        previous_pairs = self.previous_pairs(
+            User.objects.draw_participants(exchange).values("id"), exchange
+        )
+        logger.info("Loaded %d previous sender-recipient pairs.", len(previous_pairs))
+        draw_run.load_seconds = perf_counter() - start
+        draw_run.num_previous_pairs = len(previous_pairs)
+
+        cycle = draw_run.run(user_ids, previous_pairs)
+
+        # Only the selected cycle is turned into draws.
+        logger.info("Writing draws to database.")
+        draws = self.bulk_create(self._draws(exchange, cycle))
+        draw_run.save()
+        return draws
+
+    def with_context_data(self, draws):
+        """
+        Get draws with the context data specific to each of them, in two queries.
+
+        Draws are loaded along with their senders, recipients and exchanges, and the
+        senders to each draw's sender are loaded in one go. Returns a list of tuples of
+        each draw and its context data.
+
+        Senders which aren't found are looked up again, one by one, by
+        get_draw_context_data.
+        """
+
+        draws = list(draws.select_related("sender", "recipient", "exchange"))
+        senders = {
+            (draw.exchange_id, draw.recipient_id): draw.sender
+            for draw in self.filter(
+                exchange_id__in={draw.exchange_id for draw in draws},
+                recipient_id__in=[draw.sender_id for draw in draws],
+            ).select_related("sender")
+        }
+
+        return [
+            (
+                draw,
+                draw.get_draw_context_data(
+                    sender=senders.get((draw.exchange_id, draw.sender_id))
+                ),
+            )
+            for draw in draws
+        ]
+
+    def bulk_create_from_checkpoint(self, draw_run):
+        """
+        Create draws for an exchange from the best cycle a draw run found so far.
+
+        Used when a draw run is interrupted before it finishes. If the exchange
+        already has draws, they're kept and the run is just marked finished.
+        """
+
+        cycle = draw_run.best_cycle
+        draw_run.best_cycle = None
+        draw_run.finished = now()
+        draws = []
+        # The run may have been interrupted after its draws were written.
+        if draw_run.exchange.draws.exists():
+            logger.warning("%s already has draws.", draw_run.exchange)
+        else:
+            logger.info(
+                "Writing draws with score %d from checkpoint to database.",
+                draw_run.score,
+            )
+            draws = self.bulk_create(self._draws(draw_run.exchange, cycle))
+
+        draw_run.save()
+        return draws
+
+
+class DrawRunManager(models.Manager):
+    """Draw run manager."""
+
+    def prepare(self, exchange, options=None):  # pylint: disable=no-self-use
+        """Prepare an unsaved draw run for an exchange, with DrawOptions."""
+
+        if options is None:
+            options = DrawOptions()
+
+        return DrawRun(
+            exchange=exchange,
+            engine=draw_engines.get_engine_path(
+                options.engine_class or draw_engines.get_engine_class()
+            ),
+            seed=draw_engines.new_seed() if options.seed is None else options.seed,
+            processes=options.processes,
+            max_attempts=options.max_attempts,
+            started=now(),
+        )
+
+    def measured_throughput(self, num_runs=10):
+        """
+        Measure draw throughput from recent runs.
+
+        Returns a tuple of the number of users an engine gets through per second per
+        attempt, and the number of seconds it takes to load each previous pair. Returns
+        None if there are no measurements.
+        """
+
+        runs = (
+            self.filter(finished__isnull=False, num_previous_pairs__isnull=False)
+            .exclude(num_participants=0)
+            .only("num_participants", "num_previous_pairs", "attempts", "load_seconds")
+            .order_by("-started")[:num_runs]
+        )
+
+        user_attempts = 0
+        attempt_seconds = 0
+        previous_pairs = 0
+        load_seconds = 0
+        for run in runs:
+            user_attempts += run.num_participants * len(run.attempts)
+            attempt_seconds += sum(seconds for _, seconds in run.attempts)
+            previous_pairs += run.num_previous_pairs
+            load_seconds += run.load_seconds
+
+        if not user_attempts or not attempt_seconds:
+            return None
+
+        return (
+            user_attempts / attempt_seconds,
+            load_seconds / previous_pairs if previous_pairs else 0,
+        )
+
+
+# Fields are filled in as the run goes, and pylint counts each of them.
+class DrawRun(models.Model):  # pylint: disable=too-many-instance-attributes
+    """
+    A run of a draw engine for an exchange.
+
+    Records everything needed to replay the run: the engine, the seed and the
+    participants. Previous pairs can be reloaded from draws created before the run
+    started.
+
+    While the run is in progress, the best cycle found so far and its score are
+    checkpointed every CREATE_DRAW_CHECKPOINT_SECONDS, so that an interrupted run can
+    be written out or resumed. The checkpoint is cleared once the run's draws are
+    written. A resumed run isn't replayed exactly.
+
+    Runs which haven't finished by their deadline were killed along with their task,
+    and are picked up again by the scheduler.
+    """
+
+    exchange = models.ForeignKey(
+        Exchange, on_delete=models.CASCADE, related_name="draw_runs"
+    )
+    engine = models.TextField()
+    seed = models.BigIntegerField()
+    processes = models.PositiveIntegerField(default=1)
+    max_attempts = models.PositiveIntegerField()
+    participant_ids = models.JSONField(default=list)
+    num_participants = models.PositiveIntegerField(blank=True, null=True)
+    num_previous_pairs = models.PositiveIntegerField(blank=True, null=True)
+    attempts = models.JSONField(
+        default=list, help_text="Score and duration in seconds of each attempt."
+    )
+    score = models.IntegerField(blank=True, null=True)
+    best_cycle = models.JSONField(
+        blank=True, null=True, help_text="Best cycle found so far, as user IDs."
+    )
+    checkpointed = models.DateTimeField(blank=True, null=True)
+    resumes = models.PositiveIntegerField(default=0)
+    deadline = models.DateTimeField(
+        blank=True,
+        null=True,
+        help_text="When the task running the draw is killed by its time limit.",
+    )
+    load_seconds = models.FloatField(blank=True, null=True)
+    draw_seconds = models.FloatField(blank=True, null=True)
+    started = models.DateTimeField()
+    finished = models.DateTimeField(blank=True, null=True)
+
+    objects = DrawRunManager()
+
+    class Meta:
+        ordering = ["-started"]
+
+    def __str__(self):
+        return f"{ self.exchange } ({ self.started })"
+
+    def checkpoint(self, cycle, score):
+        """Record the best cycle found so far, saving it if a checkpoint is due."""
+
+        self.best_cycle = list(cycle)
+        self.score = score
+        last_saved = self.checkpointed or self.started
+        if (now() - last_saved).total_seconds() >= (
+            settings.CREATE_DRAW_CHECKPOINT_SECONDS
+        ):
+            logger.info("Checkpointing a result with score %d.", score)
+            self.checkpointed = now()
+            self.save()
+
+    def run(self, user_ids, previous_pairs):
+        """Run the draw engine, record the results and return the best cycle."""
+
+        engine_class = draw_engines.get_engine_class(self.engine)
+        logger.info(
+            "Drawing with %s in %d processes with seed %d.",
+            engine_class.__name__,
+            self.processes,
+            self.seed,
+        )
+
+        user_ids = list(user_ids)
+        initial_cycle = None
+        if self.best_cycle is not None:
+            if self.participant_ids == user_ids:
+                initial_cycle = self.best_cycle
+            else:
+                logger.warning("Participants have changed. Ignoring checkpoint.")
+                self.best_cycle = None
+                self.score = None
+
+        self.participant_ids = user_ids
+        self.num_participants = len(self.participant_ids)
+
+        start = perf_counter()
+        cycle, score, attempts = draw_engines.run_draw(
+            engine_class,
+            previous_pairs,
+            user_ids,
+            self.max_attempts,
+            processes=self.processes,
+            # Don't repeat the attempts made before being resumed.
+            seed=f"{ self.seed }+{ self.resumes }" if self.resumes else self.seed,
+            initial_cycle=initial_cycle,
+            on_improvement=self.checkpoint,
+        )
+        self.draw_seconds = perf_counter() - start
+        self.score = score
+        self.best_cycle = None
+        self.attempts = [
+            [attempt_score, round(seconds, 6)] for attempt_score, seconds in attempts
+        ]
+        self.finished = now()
+        logger.info(
+            "Selected a result with score %d (higher is worse; zero is perfect).",
+            score,
+        )
+
+        return cycle
+
+    def replay(self, engine_class=None, processes=None):
+        """
+        Replay this run, without writing anything to the database.
+
+        The engine and number of processes can be changed to compare them against
+        the same draw. Returns the best cycle and its score, and the score and
+        duration of each attempt.
+        """
+
+        previous_pairs = Draw.objects.previous_pairs(
+            self.participant_ids, self.exchange, before=self.started
+        )
+        return draw_engines.run_draw(
+            engine_class or draw_engines.get_engine_class(self.engine),
+            previous_pairs,
+            self.participant_ids,
+            self.max_attempts,
+            processes=processes or self.processes,
+            seed=self.seed,
+        )
+
+
+class Draw(models.Model):
+    """Draw of a sender and a recipient for an exchange."""
+
+    sender = models.ForeignKey(
+        "af_gang_mail.User", on_delete=models.PROTECT, related_name="draws_as_sender"
+    )
+    recipient = models.ForeignKey(
+        "af_gang_mail.User", on_delete=models.PROTECT, related_name="draws_as_recipient"
+    )
+    exchange = models.ForeignKey(
+        "af_gang_mail.Exchange", on_delete=models.PROTECT, related_name="draws"
+    )
+    sent = models.DateTimeField(blank=True, null=True)
+    received = models.DateTimeField(blank=True, null=True)
+    created = models.DateTimeField(auto_now_add=True)
+    updated = models.DateTimeField(auto_now=True)
+
+    objects = DrawManager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["exchange", "sender"], name="send_once_per_exchange"
+            ),
+            models.UniqueConstraint(
+                fields=["exchange", "recipient"], name="receive_once_per_exchange"
+            ),
+        ]
+        # Cover selecting who to send reminders to.
+        indexes = [
+            models.Index(
+                fields=["exchange", "sender"],
+                condition=Q(sent__isnull=True),
+                name="unsent_draws",
+            ),
+            models.Index(
+                fields=["exchange", "sender"],
+                condition=Q(received__isnull=True),
+                name="unreceived_draws",
+            ),
+        ]
+
+    email_templates = {
+        "created": "af_gang_mail/draw-created-email",
+        "send_reminder": "af_gang_mail/send-reminder-email",
+        "receive_reminder": "af_gang_mail/receive-reminder-email",
+    }
+
+    def get_draw_context_data(self, sender=None):
+        """
+        Get context data specific to this draw.
+
+        The sender to this draw's sender is looked up unless it's given.
+        """
+
+        if sender is None:
+            try:
+                sender = self.exchange.draws.get(recipient=self.sender).sender
+            except Draw.DoesNotExist:
+                logger.warning(
+                    "Sender not found for exchange ID %s and recipient ID %s",
+                    self.exchange_id,
+                    self.sender_id,
+                )
+
+        return {"draw": self, "recipient": self.recipient, "sender": sender}
+
+    def get_context_data(self, sender=None):
+        """
+        Get context data to render information about this draw.
+
+        The sender to this draw's sender is looked up unless it's given.
+        """
+
+        return {
+            **emails.get_exchange_context_data(self.exchange),
+            **self.get_draw_context_data(sender=sender),
+        }
+
+    @property
+    def email_address(self):
+        return self.sender.email
+
+    def get_email_merge_data(self, context=None):
+        """
+        Get merge data for emails which use templates on the email provider.
+
+        Pass context from get_draw_context_data if it's already known.
+        """
+
+        if context is None:
+            context = self.get_draw_context_data()
+
+        return {
+            "name": self.sender.get_full_name(),
+            "recipient_name": self.recipient.get_full_name(),
+            "sender_name": context["sender"].get_full_name()
+            if context["sender"]
+            else "",
+        }
+
+    def as_email_message(self, kind, renderer=None, context=None, **kwargs):
+        """
+        Construct an EmailMessage of a kind in email_templates.
+
+        Pass a renderer for the kind of email when constructing a number of messages,
+        and context from get_draw_context_data if it's already known.
+        """
+
+        if renderer is None:
+            renderer = emails.EmailRenderer(self.email_templates[kind])
+
+        if context is None:
+            context = self.get_draw_context_data()
+
+        return renderer.render(self.exchange, context, [self.email_address], **kwargs)
+
+    def as_created_email_message(self, **kwargs):
+        return self.as_email_message("created", **kwargs)
+
+    def as_send_reminder_email_message(self, **kwargs):
+        return self.as_email_message("send_reminder", **kwargs)
+
+    def as_receive_reminder_email_message(self, **kwargs):
+        return self.as_email_message("receive_reminder", **kwargs)
+
+
+class EmailSendManager(models.Manager):
+    """Email send manager."""
+
+    def bulk_create_for_users(self, exchange, kind, user_ids):
+        """
+        Record emails of a kind to users in an exchange.
+
+        Users who already have a record for the email are skipped, so this can be
+        called again for the same users.
+        """
+
+        user_ids = iter(user_ids)
+        while True:
+            batch = list(islice(user_ids, settings.EMAIL_BATCH_SIZE))
+            if not batch:
+                break
+
+            self.bulk_create(
+                (
+                    EmailSend(exchange=exchange, user_id=user_id, kind=kind)
+                    for user_id in batch
+                ),
+                ignore_conflicts=True,
+            )
+
+    def unsent(self):
+        """
+        Get emails which haven't been sent yet.
+
+        Emails which have failed EMAIL_MAX_ATTEMPTS times are given up on.
+        """
+
+        return self.exclude(status=EmailSend.Status.SENT).filter(
+            attempts__lt=settings.EMAIL_MAX_ATTEMPTS
+        )
+
+    def claim(self, email_send_ids):
+        """
+        Claim unsent emails so that no other task sends them.
+
+        Emails are locked while they're claimed and emails locked by another task are
+        skipped. Claimed emails are marked as sending until their results are
+        recorded. Emails another task is sending are skipped, unless they were claimed
+        longer ago than CELERY_TASK_TIME_LIMIT, when that task must have been killed.
+        Returns a list of the emails claimed.
+        """
+
+        claimed = now()
+        with transaction.atomic():
+            email_sends = list(
+                self.unsent()
+                .filter(id__in=email_send_ids)
+                .exclude(
+                    status=EmailSend.Status.SENDING,
+                    updated__gt=claimed
+                    - timedelta(seconds=settings.CELERY_TASK_TIME_LIMIT),
+                )
+                .select_for_update(skip_locked=True)
+            )
+            self.filter(id__in=[email_send.id for email_send in email_sends]).update(
+                status=EmailSend.Status.SENDING, updated=claimed
+            )
+
+        for email_send in email_sends:
+            email_send.status = EmailSend.Status.SENDING
+            email_send.updated = claimed
+
+        return email_sends
+
+    def release(self, email_sends):
+        """Release claimed emails which weren't sent, so they can be claimed again."""
+
+        self.filter(
+            id__in=[email_send.id for email_send in email_sends],
+            status=EmailSend.Status.SENDING,
+        ).update(status=EmailSend.Status.PENDING, updated=now())
+
+
+class EmailSend(models.Model):
+    """
+    An email to a user about an exchange.
+
+    Email tasks record who they're going to send to before sending anything, then
+    only send emails which haven't been sent, so they can be rerun safely. Emails are
+    claimed by the task sending them, so overlapping tasks don't send them twice.
+    """
+
+    class Status(models.TextChoices):
+        PENDING = "pending"
+        SENDING = "sending"
+        SENT = "sent"
+        FAILED = "failed"
+
+    exchange = models.ForeignKey(
+        Exchange, on_delete=models.CASCADE, related_name="email_sends"
+    )
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="email_sends")
+    kind = models.TextField()
+    status = models.TextField(choices=Status.choices, default=Status.PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    provider_id = models.TextField(
+        blank=True, help_text="ID given to the email by the email provider."
+    )
+    error = models.TextField(blank=True)
+    sent = models.DateTimeField(blank=True, null=True)
+    created = models.DateTimeField(auto_now_add=True)
+    updated = models.DateTimeField(auto_now=True)
+
+    objects = EmailSendManager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["exchange", "user", "kind"], name="email_once_per_exchange"
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=["exchange", "kind"],
+                condition=~Q(status="sent"),
+                name="unsent_emails",
+            )
+        ]
+
+    def __str__(self):
+        return f"{ self.kind } email to { self.user } for { self.exchange }"
+
+
+class PeriodicTaskClaim(models.Model):
+    """
+    When the scheduler last enqueued a periodic task.
+
+    Rows are locked while they're claimed, so overlapping scheduler runs never enqueue
+    the same periodic task twice.
+    """
+
+    name = models.TextField(unique=True)
+    claimed = models.DateTimeField(blank=True, null=True)
+
+    def __str__(self):
+        return self.name
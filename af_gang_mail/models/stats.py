@@ -0,0 +1,343 @@
+"""Stats models."""
+
+from datetime import timedelta
+from math import floor
+
+from django.db import models, transaction
+from django.db.models import Count, Exists, OuterRef, Q
+from django.utils import timezone
+
+import django_countries
+from allauth.account.models import EmailAddress
+from django_countries.fields import CountryField
+
+from af_gang_mail.models.core import Draw, Exchange, User, UserInExchange
+
+
+def _percentage(count, total):
+    return floor(count / total * 100)
+
+
+class StatsSnapshotManager(models.Manager):
+    """Stats snapshot manager."""
+
+    # Labels of user stats, and the fields they count users with.
+    user_fields = [
+        ("Users with First Name", "first_name"),
+        ("Users with Last Name", "last_name"),
+        ("Users with Address Line 1", "address_line_1"),
+        ("Users with Address Line 2", "address_line_2"),
+        ("Users with Address City", "address_city"),
+        ("Users with Address State", "address_state"),
+        ("Users with Address Postcode", "address_postcode"),
+        ("Users with Address Country", "address_country"),
+    ]
+
+    def _get_user_percentages(self, users):
+        """Get user percentages, in two queries."""
+
+        verified_email_addresses = EmailAddress.objects.filter(
+            user=OuterRef("pk"), verified=True
+        )
+        counts = User.objects.annotate(
+            has_verified_email_address=Exists(verified_email_addresses)
+        ).aggregate(
+            verified=Count("id", filter=Q(has_verified_email_address=True)),
+            **{
+                field: Count("id", filter=~Q(**{field: ""}))
+                for _, field in self.user_fields
+            },
+        )
+        percentages = [("Users with Verified Email", counts["verified"])] + [
+            (label, counts[field]) for label, field in self.user_fields
+        ]
+
+        country_names = dict(django_countries.countries)
+        for row in (
+            User.objects.values("address_country")
+            .annotate(users=Count("id"))
+            .order_by("address_country")
+        ):
+            country = row["address_country"]
+            country_name = country_names.get(country, f"Unkown Country ({ country })")
+            percentages.append((f"Users in { country_name }", row["users"]))
+
+        return [(label, _percentage(count, users)) for label, count in percentages]
+
+    def _get_exchange_percentages(self, users, since):  # pylint: disable=no-self-use
+        """Get percentages for exchanges which haven't finished, in two queries."""
+
+        exchanges = list(Exchange.objects.filter(received__gt=since))
+        verified_email_addresses = EmailAddress.objects.filter(
+            user=OuterRef("user"), verified=True
+        )
+        no_name = Q(user__first_name="") & Q(user__last_name="")
+        counts = {
+            row["exchange"]: row
+            for row in UserInExchange.objects.filter(exchange__in=exchanges)
+            .annotate(has_verified_email_address=Exists(verified_email_addresses))
+            .values("exchange")
+            .annotate(
+                users=Count("id"),
+                confirmed=Count("id", filter=Q(confirmed=True)),
+                eligible=Count(
+                    "id",
+                    filter=Q(has_verified_email_address=True, user__is_active=True)
+                    & ~no_name,
+                ),
+                unverified=Count("id", filter=Q(has_verified_email_address=False)),
+                no_name=Count("id", filter=no_name),
+            )
+            .order_by()
+        }
+
+        percentages = []
+        for exchange in exchanges:
+            row = counts.get(exchange.id, {"users": 0})
+            percentages.append(
+                (f"Users in { exchange.name }", _percentage(row["users"], users))
+            )
+            if not row["users"]:
+                continue
+
+            percentages += [
+                (
+                    f"Eligible Users in { exchange.name }",
+                    _percentage(row["eligible"], row["users"]),
+                ),
+                (
+                    f"Users confirmed for { exchange.name }",
+                    _percentage(row["confirmed"], row["users"]),
+                ),
+                (
+                    f"Users ineligible due to unverified email in { exchange.name }",
+                    _percentage(row["unverified"], row["users"]),
+                ),
+                (
+                    f"Users ineligible due to missing name in { exchange.name }",
+                    _percentage(row["no_name"], row["users"]),
+                ),
+            ]
+
+        return percentages
+
+    def create_from_database(self):
+        """Compute stats and save them in a new snapshot."""
+
+        created = timezone.now()
+        users = User.objects.count()
+        percentages = []
+        if users:
+            percentages = self._get_user_percentages(
+                users
+            ) + self._get_exchange_percentages(users, created)
+
+        return self.create(users=users, percentages=percentages, created=created)
+
+
+class StatsSnapshot(models.Model):
+    """
+    A snapshot of stats for the statto page.
+
+    Computing stats means counting every user, so they're computed periodically by a
+    task instead of on every page view.
+    """
+
+    users = models.PositiveIntegerField()
+    percentages = models.JSONField(
+        default=list, help_text="List of labels and percentages, in display order."
+    )
+    created = models.DateTimeField()
+
+    objects = StatsSnapshotManager()
+
+    class Meta:
+        get_latest_by = "created"
+
+    def __str__(self):
+        return f"Stats at { self.created }"
+
+
+class DailyRollupManager(models.Manager):
+    """Daily rollup manager."""
+
+    def _count_users(self, now):  # pylint: disable=no-self-use
+        """Count users per country, and per exchange and country."""
+
+        no_name = Q(first_name="") & Q(last_name="")
+        verified_email_addresses = EmailAddress.objects.filter(
+            user=OuterRef("pk"), verified=True
+        )
+        counts = {
+            (None, row["address_country"]): row
+            for row in User.objects.annotate(
+                has_verified_email_address=Exists(verified_email_addresses)
+            )
+            .values("address_country")
+            .annotate(
+                users=Count("id"),
+                verified=Count("id", filter=Q(has_verified_email_address=True)),
+                eligible=Count(
+                    "id",
+                    filter=Q(has_verified_email_address=True, is_active=True)
+                    & ~no_name,
+                ),
+            )
+            .order_by()
+        }
+
+        no_name = Q(user__first_name="") & Q(user__last_name="")
+        verified_email_addresses = EmailAddress.objects.filter(
+            user=OuterRef("user"), verified=True
+        )
+        counts.update(
+            {
+                (row["exchange"], row["user__address_country"]): row
+                for row in UserInExchange.objects.filter(
+                    exchange__received__gt=now - self.model.DAYS_AFTER_RECEIVED
+                )
+                .annotate(has_verified_email_address=Exists(verified_email_addresses))
+                .values("exchange", "user__address_country")
+                .annotate(
+                    users=Count("id"),
+                    verified=Count("id", filter=Q(has_verified_email_address=True)),
+                    confirmed=Count("id", filter=Q(confirmed=True)),
+                    eligible=Count(
+                        "id",
+                        filter=Q(has_verified_email_address=True, user__is_active=True)
+                        & ~no_name,
+                    ),
+                )
+                .order_by()
+            }
+        )
+
+        return counts
+
+    def _count_draws(self, now, role, field):  # pylint: disable=no-self-use
+        """Count draws with field set, per exchange and country of role."""
+
+        return {
+            (row["exchange"], row[f"{ role }__address_country"]): row["count"]
+            for row in Draw.objects.filter(
+                exchange__received__gt=now - self.model.DAYS_AFTER_RECEIVED,
+                **{f"{ field }__isnull": False},
+            )
+            .values("exchange", f"{ role }__address_country")
+            .annotate(count=Count("id"))
+            .order_by()
+        }
+
+    def rollup(self, date=None):
+        """
+        Count users and draws, replacing any rollups for date, which defaults to today.
+
+        Counts are totals as they were when this runs, in four queries.
+        """
+
+        now = timezone.now()
+        if date is None:
+            date = now.date()
+
+        counts = self._count_users(now)
+        sent = self._count_draws(now, "sender", "sent")
+        received = self._count_draws(now, "sender", "received")
+
+        rollups = []
+        for exchange_id, country in counts.keys() | sent.keys() | received.keys():
+            row = counts.get((exchange_id, country), {})
+            rollups.append(
+                self.model(
+                    date=date,
+                    exchange_id=exchange_id,
+                    country=country,
+                    users=row.get("users", 0),
+                    verified=row.get("verified", 0),
+                    confirmed=row.get("confirmed", 0),
+                    eligible=row.get("eligible", 0),
+                    sent=sent.get((exchange_id, country), 0),
+                    received=received.get((exchange_id, country), 0),
+                )
+            )
+
+        with transaction.atomic():
+            self.filter(date=date).delete()
+            return self.bulk_create(rollups)
+
+    def trends(self, since):
+        """
+        Get daily totals across countries since a date.
+
+        Returns a dictionary of lists of rollups by exchange name, with None for
+        totals of all users.
+        """
+
+        trends = {}
+        for row in (
+            self.filter(date__gte=since)
+            .values("date", "exchange__name")
+            .annotate(
+                **{
+                    field: models.Sum(field)
+                    for field in [
+                        "users",
+                        "verified",
+                        "confirmed",
+                        "eligible",
+                        "sent",
+                        "received",
+                    ]
+                }
+            )
+            .order_by("exchange__drawn", "date")
+        ):
+            trends.setdefault(row.pop("exchange__name"), []).append(row)
+
+        return trends
+
+
+class DailyRollup(models.Model):
+    """
+    Daily counts of users and draws, per exchange and country.
+
+    Rollups without an exchange count all users. Rollups are created by a nightly task
+    so trends can be shown without scanning users, draws or users in exchanges.
+    """
+
+    # Exchanges are rolled up until this long after they're received.
+    DAYS_AFTER_RECEIVED = timedelta(days=7)
+
+    date = models.DateField()
+    exchange = models.ForeignKey(
+        Exchange,
+        on_delete=models.CASCADE,
+        related_name="daily_rollups",
+        blank=True,
+        null=True,
+    )
+    country = CountryField(blank=True)
+    users = models.PositiveIntegerField(default=0)
+    verified = models.PositiveIntegerField(default=0)
+    confirmed = models.PositiveIntegerField(default=0)
+    eligible = models.PositiveIntegerField(default=0)
+    sent = models.PositiveIntegerField(default=0)
+    received = models.PositiveIntegerField(default=0)
+
+    objects = DailyRollupManager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["date", "exchange", "country"],
+                name="daily_rollup_per_exchange_country",
+            ),
+            models.UniqueConstraint(
+                fields=["date", "country"],
+                condition=Q(exchange__isnull=True),
+                name="daily_rollup_per_country",
+            ),
+        ]
+
+    def __str__(self):
+        exchange = self.exchange or "all users"
+        return f"{ exchange } in { self.country or 'unknown country' } on { self.date }"
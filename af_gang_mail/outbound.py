@@ -0,0 +1,217 @@
+"""
+Outbound mail.
+
+Email batch tasks send their messages through a Mailer, which keeps one connection
+to the email provider open per worker process, limits how fast messages are sent,
+and backs off and retries when the provider says it's overloaded. Rate limits are
+per worker process, so the total rate is the limit multiplied by the number of
+worker processes.
+"""
+
+import logging
+import smtplib
+import time
+
+from django.conf import settings
+from django.core import mail
+
+from anymail.exceptions import AnymailAPIError
+
+logger = logging.getLogger(__name__)
+
+# Longest we'll back off for before retrying, in seconds.
+MAX_BACKOFF_SECONDS = 60
+
+
+class TokenBucket:
+    """
+    Token bucket rate limit.
+
+    The bucket fills with rate tokens per second, up to capacity tokens. Each message
+    takes a token, waiting for one if the bucket is empty. If rate is None, tokens are
+    never waited for.
+    """
+
+    def __init__(self, rate, capacity, clock=time.monotonic, sleep=time.sleep):
+        self.rate = rate
+        self.capacity = capacity
+        self.clock = clock
+        self.sleep = sleep
+        self.tokens = capacity
+        self.updated = clock()
+
+    def take(self):
+        """Take a token, waiting for one if needed. Returns the seconds waited."""
+
+        if self.rate is None:
+            return 0
+
+        now = self.clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+        wait = 0
+        if self.tokens < 1:
+            wait = (1 - self.tokens) / self.rate
+            self.sleep(wait)
+            self.tokens = 1
+            self.updated = now + wait
+
+        self.tokens -= 1
+        return wait
+
+
+class Metrics:
+    """Counts of messages sent by a mailer."""
+
+    def __init__(self):
+        self.sent = 0
+        self.failed = 0
+        self.retries = 0
+        self.seconds = 0
+        self.throttled_seconds = 0
+
+    @property
+    def messages_per_second(self):
+        return self.sent / self.seconds if self.seconds else 0
+
+
+def retry_after(exception):
+    """
+    Get the seconds to wait before retrying after an exception, if it's temporary.
+
+    HTTP APIs saying there have been too many requests and SMTP servers giving 4xx
+    replies are temporary, and so are dropped SMTP connections. Returns None for
+    anything else.
+    """
+
+    if isinstance(exception, AnymailAPIError):
+        if getattr(exception, "status_code", None) != 429:
+            return None
+
+        try:
+            return float(exception.response.headers["Retry-After"])
+        except (AttributeError, KeyError, TypeError, ValueError):
+            return 0
+
+    if isinstance(exception, smtplib.SMTPServerDisconnected):
+        return 0
+
+    if isinstance(exception, smtplib.SMTPResponseException):
+        return 0 if 400 <= exception.smtp_code < 500 else None
+
+    return None
+
+
+class Mailer:
+    """
+    Send messages through a rate limited, reused connection.
+
+    The connection is opened when the first message is sent and kept open for later
+    messages. If sending fails, the connection is closed and a new one is opened for
+    the next attempt.
+    """
+
+    def __init__(  # pylint: disable=too-many-arguments
+        self,
+        backend,
+        rate=None,
+        burst=1,
+        retries=0,
+        backoff_seconds=1,
+        clock=time.monotonic,
+        sleep=time.sleep,
+    ):
+        self.backend = backend
+        # The bucket's clock and sleep are used for timing and backing off, too.
+        self.bucket = TokenBucket(rate or None, burst, clock=clock, sleep=sleep)
+        self.retries = retries
+        self.backoff_seconds = backoff_seconds
+        self.connection = None
+        self.metrics = Metrics()
+
+    def _get_connection(self):
+        if self.connection is None:
+            self.connection = mail.get_connection(self.backend)
+            self.connection.open()
+
+        return self.connection
+
+    def close(self):
+        """Close the connection, if it's open."""
+
+        if self.connection is not None:
+            try:
+                self.connection.close()
+            except Exception:  # pylint: disable=broad-except
+                logger.exception("Failed to close connection.")
+
+            self.connection = None
+
+    def send(self, message):
+        """
+        Send a message.
+
+        Temporary failures are retried up to retries times, backing off exponentially
+        from backoff_seconds, or for as long as the provider asks. Anything else is
+        raised.
+        """
+
+        start = self.bucket.clock()
+        try:
+            for attempt in range(self.retries + 1):
+                self.metrics.throttled_seconds += self.bucket.take()
+
+                try:
+                    self._get_connection().send_messages([message])
+                except Exception as exception:  # pylint: disable=broad-except
+                    self.close()
+                    wait = retry_after(exception)
+                    if wait is None or attempt >= self.retries:
+                        self.metrics.failed += 1
+                        raise
+
+                    wait = min(
+                        max(wait, self.backoff_seconds * 2 ** attempt),
+                        MAX_BACKOFF_SECONDS,
+                    )
+                    logger.warning(
+                        "Temporary failure sending message (%s). Retrying in %f "
+                        "seconds.",
+                        exception,
+                        wait,
+                    )
+                    self.metrics.retries += 1
+                    self.bucket.sleep(wait)
+                else:
+                    self.metrics.sent += 1
+                    return
+
+        finally:
+            self.metrics.seconds += self.bucket.clock() - start
+
+
+# Mailers for this process, by backend and rate limit settings.
+_mailers = {}  # pylint: disable=invalid-name
+
+
+def get_mailer():
+    """Get the mailer for this process, configured from settings."""
+
+    key = (
+        settings.CELERY_EMAIL_BACKEND,
+        settings.EMAIL_RATE_LIMIT,
+        settings.EMAIL_RATE_LIMIT_BURST,
+        settings.EMAIL_SEND_RETRIES,
+        settings.EMAIL_SEND_BACKOFF_SECONDS,
+    )
+    if key not in _mailers:
+        _mailers[key] = Mailer(
+            settings.CELERY_EMAIL_BACKEND,
+            rate=settings.EMAIL_RATE_LIMIT,
+            burst=settings.EMAIL_RATE_LIMIT_BURST,
+            retries=settings.EMAIL_SEND_RETRIES,
+            backoff_seconds=settings.EMAIL_SEND_BACKOFF_SECONDS,
+        )
+
+    return _mailers[key]
@@ -0,0 +1,272 @@
+"""
+Scheduler.
+
+Each exchange goes through phases (sending confirmations, drawing, sending
+reminders, …) which are due once the phase's date has passed. The scheduler claims
+due phases by setting their started column and enqueues their tasks once the claim
+is committed. Rows are locked while they're claimed and rows locked by another run
+are skipped, so overlapping runs never enqueue the same phase twice.
+
+The scheduler also enqueues periodic tasks, which aren't tied to exchanges, and
+picks up draw runs whose tasks were killed before they finished.
+"""
+
+import logging
+from collections import namedtuple
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Min, Q
+from django.utils import timezone
+
+from af_gang_mail import models, tasks
+
+logger = logging.getLogger(__name__)
+
+Phase = namedtuple("Phase", ["name", "date_field", "started_field", "enqueue"])
+
+PHASES = [
+    Phase(
+        "confirmation",
+        "confirmation",
+        "confirmation_started",
+        lambda exchange: tasks.send_confirmation_emails.delay(exchange.id),
+    ),
+    Phase(
+        "confirmation reminder",
+        "confirmation_reminder",
+        "confirmation_reminder_started",
+        lambda exchange: tasks.send_confirmation_reminder_emails.delay(exchange.id),
+    ),
+    Phase(
+        "draw",
+        "drawn",
+        "draw_started",
+        tasks.enqueue_draw_exchange_task,
+    ),
+    Phase(
+        "send reminder",
+        "sent",
+        "send_reminder_started",
+        lambda exchange: tasks.send_send_reminders.delay(exchange.id),
+    ),
+    Phase(
+        "receive reminder",
+        "received",
+        "receive_reminder_started",
+        lambda exchange: tasks.send_receive_reminders.delay(exchange.id),
+    ),
+]
+
+PeriodicTask = namedtuple("PeriodicTask", ["name", "interval_setting", "task"])
+
+PERIODIC_TASKS = [
+    PeriodicTask(
+        "stats-snapshot", "STATS_SNAPSHOT_SECONDS", tasks.refresh_stats_snapshot
+    ),
+    PeriodicTask("daily-rollup", "DAILY_ROLLUP_SECONDS", tasks.rollup_daily_stats),
+]
+
+
+def is_due(phase, exchange, now):
+    """Is a phase of an exchange due at a time?"""
+
+    date = getattr(exchange, phase.date_field)
+    return (
+        date is not None
+        and date < now
+        and getattr(exchange, phase.started_field) is None
+    )
+
+
+def _enqueue(claimed):
+    for phase, exchange in claimed:
+        phase.enqueue(exchange)
+        logger.info("Enqueued %s for %s.", phase.name, exchange.name)
+
+
+def run(phases=None):
+    """
+    Claim and enqueue every due phase.
+
+    Due exchanges are selected and locked in one query, then each phase's started
+    column is set with one update. Returns a list of (phase, exchange) claimed.
+    """
+
+    if phases is None:
+        phases = PHASES
+
+    now = timezone.now()
+    due = Q()
+    for phase in phases:
+        due |= Q(
+            **{
+                f"{ phase.date_field }__lt": now,
+                f"{ phase.started_field }__isnull": True,
+            }
+        )
+
+    claimed = []
+    with transaction.atomic():
+        exchanges = list(
+            models.Exchange.objects.filter(due).select_for_update(skip_locked=True)
+        )
+        for phase in phases:
+            phase_exchanges = [
+                exchange for exchange in exchanges if is_due(phase, exchange, now)
+            ]
+            if not phase_exchanges:
+                continue
+
+            models.Exchange.objects.filter(
+                id__in=[exchange.id for exchange in phase_exchanges]
+            ).update(**{phase.started_field: now})
+            for exchange in phase_exchanges:
+                setattr(exchange, phase.started_field, now)
+                claimed.append((phase, exchange))
+                logger.debug(
+                    "Set %s for %s to %s.", phase.started_field, exchange.name, now
+                )
+
+        transaction.on_commit(lambda: _enqueue(claimed))
+
+    return claimed
+
+
+def _enqueue_periodic(claimed):
+    for periodic_task in claimed:
+        periodic_task.task.delay()
+        logger.info("Enqueued %s.", periodic_task.name)
+
+
+def run_periodic(periodic_tasks=None):
+    """
+    Enqueue periodic tasks which haven't been enqueued within their interval.
+
+    Each task has a claim row, which is locked while it's claimed, and rows locked by
+    another run are skipped, so overlapping runs never enqueue the same task twice.
+    Returns a list of periodic tasks enqueued.
+    """
+
+    if periodic_tasks is None:
+        periodic_tasks = PERIODIC_TASKS
+
+    models.PeriodicTaskClaim.objects.bulk_create(
+        [
+            models.PeriodicTaskClaim(name=periodic_task.name)
+            for periodic_task in periodic_tasks
+        ],
+        ignore_conflicts=True,
+    )
+
+    now = timezone.now()
+    claimed = []
+    with transaction.atomic():
+        claims = {
+            claim.name: claim
+            for claim in models.PeriodicTaskClaim.objects.filter(
+                name__in=[periodic_task.name for periodic_task in periodic_tasks]
+            ).select_for_update(skip_locked=True)
+        }
+        for periodic_task in periodic_tasks:
+            claim = claims.get(periodic_task.name)
+            interval = timedelta(
+                seconds=getattr(settings, periodic_task.interval_setting)
+            )
+            if claim and (claim.claimed is None or claim.claimed <= now - interval):
+                claimed.append(periodic_task)
+
+        models.PeriodicTaskClaim.objects.filter(
+            name__in=[periodic_task.name for periodic_task in claimed]
+        ).update(claimed=now)
+
+        transaction.on_commit(lambda: _enqueue_periodic(claimed))
+
+    return claimed
+
+
+def _enqueue_draw_runs(claimed):
+    for draw_run in claimed:
+        tasks.enqueue_draw_exchange_task(draw_run.exchange, draw_run=draw_run)
+        logger.info("Enqueued draw run %d for %s.", draw_run.id, draw_run.exchange)
+
+
+def resume_draws():
+    """
+    Enqueue draw runs which were killed before they finished, to be picked up again.
+
+    A run which isn't finished by its deadline was killed along with its task. Runs
+    are locked while they're claimed, and claimed by clearing their deadline, so
+    overlapping runs never enqueue the same draw run twice. Runs which have already
+    been resumed CREATE_DRAW_MAX_RESUMES times are given up on. Returns a list of draw
+    runs enqueued.
+    """
+
+    with transaction.atomic():
+        draw_runs = list(
+            models.DrawRun.objects.filter(
+                finished__isnull=True, deadline__lt=timezone.now()
+            )
+            .select_related("exchange")
+            .select_for_update(skip_locked=True, of=("self",))
+        )
+        if not draw_runs:
+            return []
+
+        models.DrawRun.objects.filter(
+            id__in=[draw_run.id for draw_run in draw_runs]
+        ).update(deadline=None, resumes=F("resumes") + 1)
+
+        claimed = []
+        for draw_run in draw_runs:
+            if (
+                draw_run.best_cycle is None
+                and draw_run.resumes >= settings.CREATE_DRAW_MAX_RESUMES
+            ):
+                logger.error(
+                    "Draw run %d for %s was killed too many times. Giving up.",
+                    draw_run.id,
+                    draw_run.exchange,
+                )
+                continue
+
+            draw_run.deadline = None
+            draw_run.resumes += 1
+            claimed.append(draw_run)
+
+        transaction.on_commit(lambda: _enqueue_draw_runs(claimed))
+
+    return claimed
+
+
+def next_due(phases=None):
+    """Get when the next unclaimed phase is due, or None if there isn't one."""
+
+    if phases is None:
+        phases = PHASES
+
+    dates = models.Exchange.objects.aggregate(
+        **{
+            phase.started_field: Min(
+                phase.date_field, filter=Q(**{f"{ phase.started_field }__isnull": True})
+            )
+            for phase in phases
+        }
+    )
+    dates = [date for date in dates.values() if date is not None]
+    return min(dates) if dates else None
+
+
+def seconds_until(date, now, max_seconds):
+    """
+    Get seconds to sleep until date, at most max_seconds.
+
+    Sleeps for at least a second so phases which are due but locked by another run
+    don't make the scheduler spin.
+    """
+
+    if date is None:
+        return max_seconds
+
+    return min(max((date - now).total_seconds(), 1), max_seconds)
@@ -1,6 +1,7 @@
 """Settings."""
 
 import ipaddress
+import json
 import logging
 import os
 import urllib
@@ -124,6 +125,21 @@ TEMPLATES = [
     },
 ]
 
+# Django caches compiled templates unless debugging. Workers render the same few email
+# templates over and over, so bin/worker sets CACHE_TEMPLATES to cache them even when
+# debugging.
+if DEBUG and os.environ.get("CACHE_TEMPLATES"):
+    del TEMPLATES[0]["APP_DIRS"]
+    TEMPLATES[0]["OPTIONS"]["loaders"] = [
+        (
+            "django.template.loaders.cached.Loader",
+            [
+                "django.template.loaders.filesystem.Loader",
+                "django.template.loaders.app_directories.Loader",
+            ],
+        )
+    ]
+
 WSGI_APPLICATION = "af_gang_mail.wsgi.application"
 
 
@@ -376,7 +392,7 @@ MANAGERS = [
 EMAIL_BACKEND = "djcelery_email.backends.CeleryEmailBackend"
 
 if "SENDINBLUE_API_KEY" in os.environ:
-    CELERY_EMAIL_BACKEND = "anymail.backends.sendinblue.EmailBackend"
+    CELERY_EMAIL_BACKEND = "af_gang_mail.email_backends.SendinBlueEmailBackend"
     ANYMAIL = {"SENDINBLUE_API_KEY": os.environ["SENDINBLUE_API_KEY"]}
 
 else:
@@ -387,6 +403,32 @@ else:
     EMAIL_HOST_PASSWORD = os.environ.get("SMTP_PASSWORD")
     EMAIL_USE_TLS = bool(os.environ.get("SMTP_TLS", True))
 
+# Emails to an exchange are rendered and sent in batches of this many, each batch in
+# its own task.
+EMAIL_BATCH_SIZE = int(os.environ.get("EMAIL_BATCH_SIZE", 100))
+
+# Emails which fail to send are retried when their task is rerun, up to this many
+# attempts.
+EMAIL_MAX_ATTEMPTS = int(os.environ.get("EMAIL_MAX_ATTEMPTS", 3))
+
+# Messages per second each worker process sends, allowing bursts of up to
+# EMAIL_RATE_LIMIT_BURST messages. Zero for no limit.
+EMAIL_RATE_LIMIT = float(os.environ.get("EMAIL_RATE_LIMIT", 5))
+EMAIL_RATE_LIMIT_BURST = int(os.environ.get("EMAIL_RATE_LIMIT_BURST", 10))
+
+# Messages which fail temporarily, such as when the email provider says there have
+# been too many requests, are retried this many times, backing off exponentially.
+EMAIL_SEND_RETRIES = int(os.environ.get("EMAIL_SEND_RETRIES", 3))
+EMAIL_SEND_BACKOFF_SECONDS = float(os.environ.get("EMAIL_SEND_BACKOFF_SECONDS", 1))
+
+# IDs of templates on the email provider for kinds of email to send in batches, as
+# JSON, such as {"send_reminder": 12}. Each batch of up to EMAIL_PROVIDER_BATCH_SIZE
+# recipients is one API call, with merge data for each recipient. Other kinds of
+# email are rendered here and sent one at a time. Only works with the SendinBlue
+# backend.
+EMAIL_PROVIDER_TEMPLATES = json.loads(os.environ.get("EMAIL_PROVIDER_TEMPLATES", "{}"))
+EMAIL_PROVIDER_BATCH_SIZE = int(os.environ.get("EMAIL_PROVIDER_BATCH_SIZE", 100))
+
 
 # Google APIs
 
@@ -454,9 +496,40 @@ COUNTRIES_FIRST_REPEAT = True
 
 # Draw creation
 
+DRAW_ENGINE = os.environ.get("DRAW_ENGINE", "af_gang_mail.draw_engines.CycleEngine")
 CREATE_DRAW_MAX_ATTEMPTS = int(os.environ.get("CREATE_DRAW_MAX_ATTEMPTS", 100))
 
+# Number of processes to spread draw attempts over. One draws in the worker process.
+CREATE_DRAW_PROCESSES = int(os.environ.get("CREATE_DRAW_PROCESSES", 1))
+
+# Used to estimate draw time limits until draw runs have been measured.
 # Default value based on Heroku hobby dynos. On my laptop this was 0.001.
 CREATE_DRAW_SECONDS_PER_USER = float(
     os.environ.get("CREATE_DRAW_SECONDS_PER_USER", 0.003)
 )
+
+# Time limits estimated from measured draw runs are multiplied by this.
+CREATE_DRAW_TIME_LIMIT_MARGIN = float(
+    os.environ.get("CREATE_DRAW_TIME_LIMIT_MARGIN", 3)
+)
+
+# How often the best draw found so far is saved while drawing, and how many times a
+# draw which runs out of time before finding anything is resumed in a new task.
+CREATE_DRAW_CHECKPOINT_SECONDS = float(
+    os.environ.get("CREATE_DRAW_CHECKPOINT_SECONDS", 30)
+)
+CREATE_DRAW_MAX_RESUMES = int(os.environ.get("CREATE_DRAW_MAX_RESUMES", 3))
+
+# Longest the scheduler sleeps between checks for due work, so it notices exchanges
+# which are created or changed while it's asleep.
+SCHEDULER_MAX_SLEEP_SECONDS = float(os.environ.get("SCHEDULER_MAX_SLEEP_SECONDS", 60))
+
+# How often the scheduler refreshes the stats shown on the statto page.
+STATS_SNAPSHOT_SECONDS = int(os.environ.get("STATS_SNAPSHOT_SECONDS", 600))
+
+# How often the scheduler rolls up daily counts for statto's trends. Each run replaces
+# the day's rollups, so running more often keeps today's counts fresher.
+DAILY_ROLLUP_SECONDS = int(os.environ.get("DAILY_ROLLUP_SECONDS", 24 * 60 * 60))
+
+# How many days of trends statto shows.
+STATTO_TREND_DAYS = int(os.environ.get("STATTO_TREND_DAYS", 30))
@@ -1,46 +1,94 @@
 """Celery tasks."""
 
 import logging
+from collections import defaultdict
+from datetime import timedelta
+from math import ceil
 
 from django.conf import settings
-from django.core import mail
+from django.utils.timezone import now
 
-from af_gang_mail import celery, models
+from anymail.message import AnymailMessage
+from celery.exceptions import SoftTimeLimitExceeded
+
+from af_gang_mail import celery, emails, models, outbound
 
 logger = logging.getLogger(__name__)
 
 
-def enqueue_draw_exchange_task(exchange):
-    """Enqueue a draw_exchange task."""
+def enqueue_draw_exchange_task(exchange, draw_run=None):
+    """Enqueue a draw_exchange task, resuming draw_run if it's given."""
 
     soft_time_limit, time_limit = _calculate_draw_exchange_time_limits(
-        exchange, max_attempts=settings.CREATE_DRAW_MAX_ATTEMPTS
+        exchange,
+        max_attempts=settings.CREATE_DRAW_MAX_ATTEMPTS,
+        processes=settings.CREATE_DRAW_PROCESSES,
     )
     draw_exchange.apply_async(
         kwargs={
             "exchange_id": exchange.id,
             "max_attempts": settings.CREATE_DRAW_MAX_ATTEMPTS,
+            "processes": settings.CREATE_DRAW_PROCESSES,
+            "draw_run_id": draw_run.id if draw_run else None,
         },
         soft_time_limit=soft_time_limit,
         time_limit=time_limit,
     )
 
 
-def _calculate_draw_exchange_time_limits(exchange, max_attempts=10):
-    """Calculate the maximum amount of time we'd expect a draw to take."""
+def _calculate_draw_exchange_time_limits(exchange, max_attempts=10, processes=1):
+    """
+    Calculate the maximum amount of time we'd expect a draw to take.
+
+    The estimate is based on the throughput measured in recent draw runs and the
+    number of previous pairs which will need to be loaded. If there are no recent draw
+    runs, it's based on CREATE_DRAW_SECONDS_PER_USER.
+    """
 
     num_users = exchange.users.count()
+    attempts_per_process = ceil(max_attempts / processes)
 
-    logger.info("Calculating time for scoring a result for %d users.", num_users)
-    soft_time_limit = num_users * settings.CREATE_DRAW_SECONDS_PER_USER
-    logger.info("Estimated %f seconds to score %d users.", soft_time_limit, num_users)
-    soft_time_limit = soft_time_limit * max_attempts
-    logger.info(
-        "Estimated %f seconds for %d users with up to %d attempts.",
-        soft_time_limit,
-        num_users,
-        max_attempts,
-    )
+    throughput = models.DrawRun.objects.measured_throughput()
+    if throughput:
+        user_attempts_per_second, seconds_per_previous_pair = throughput
+        logger.info(
+            "Measured %f users per second per attempt and %f seconds per previous "
+            "pair.",
+            user_attempts_per_second,
+            seconds_per_previous_pair,
+        )
+        num_previous_pairs = models.Draw.objects.previous_draws(
+            exchange.users.values("id"), exchange
+        ).count()
+        soft_time_limit = (
+            num_previous_pairs * seconds_per_previous_pair
+            + num_users * attempts_per_process / user_attempts_per_second
+        ) * settings.CREATE_DRAW_TIME_LIMIT_MARGIN
+        logger.info(
+            "Estimated %f seconds for %d users and %d previous pairs with up to %d "
+            "attempts in %d processes.",
+            soft_time_limit,
+            num_users,
+            num_previous_pairs,
+            max_attempts,
+            processes,
+        )
+
+    else:
+        logger.info("Calculating time for scoring a result for %d users.", num_users)
+        soft_time_limit = num_users * settings.CREATE_DRAW_SECONDS_PER_USER
+        logger.info(
+            "Estimated %f seconds to score %d users.", soft_time_limit, num_users
+        )
+        soft_time_limit = soft_time_limit * attempts_per_process
+        logger.info(
+            "Estimated %f seconds for %d users with up to %d attempts in %d "
+            "processes.",
+            soft_time_limit,
+            num_users,
+            max_attempts,
+            processes,
+        )
 
     if soft_time_limit < settings.CELERY_TASK_SOFT_TIME_LIMIT:
         logger.info(
@@ -58,33 +106,387 @@ def _calculate_draw_exchange_time_limits(exchange, max_attempts=10):
 
 
 @celery.app.task
-def draw_exchange(exchange_id, max_attempts):
+def draw_exchange(exchange_id, max_attempts, processes=1, seed=None, draw_run_id=None):
     """
     Draw an exchange.
 
     To enqueue this task, call enqueue_draw_exchange_task which will set an appropriate
     time limit.
+
+    If the draw runs out of time, draws are created from the best result found so far.
+    If nothing has been found yet, the draw run is resumed in a new task, up to
+    CREATE_DRAW_MAX_RESUMES times. If draw_run_id is given, that draw run is resumed.
+
+    The draw run's deadline is set to when this task will be killed by its time limit,
+    so the scheduler can pick the run up again if it's killed. If the run was
+    checkpointed before being killed, or the exchange already has draws, the draws
+    are created from the checkpoint instead of drawing again.
     """
 
     exchange = models.Exchange.objects.get(id=exchange_id)
-    models.Draw.objects.bulk_create_from_exchange(exchange, max_attempts=max_attempts)
+    if draw_run_id:
+        draw_run = models.DrawRun.objects.get(id=draw_run_id)
+    else:
+        draw_run = models.DrawRun.objects.prepare(
+            exchange,
+            models.DrawOptions(
+                max_attempts=max_attempts, processes=processes, seed=seed
+            ),
+        )
+
+    if draw_run.best_cycle is not None or exchange.draws.exists():
+        logger.warning("Drawing %s was interrupted. Using its checkpoint.", exchange)
+        models.Draw.objects.bulk_create_from_checkpoint(draw_run)
+        _drawn(exchange)
+        return
+
+    time_limit, _ = draw_exchange.request.timelimit or (None, None)
+    draw_run.deadline = now() + timedelta(seconds=time_limit) if time_limit else None
+    draw_run.save()
+
+    try:
+        models.Draw.objects.bulk_create_from_exchange(exchange, draw_run=draw_run)
+    except SoftTimeLimitExceeded:
+        if draw_run.best_cycle is None:
+            if draw_run.resumes >= settings.CREATE_DRAW_MAX_RESUMES:
+                logger.error("Ran out of time drawing %s. Giving up.", exchange)
+                draw_run.deadline = None
+                draw_run.save()
+                raise
+
+            logger.warning(
+                "Ran out of time drawing %s before finding a result. Resuming.",
+                exchange,
+            )
+            draw_run.resumes += 1
+            # The next task sets a new deadline when it starts.
+            draw_run.deadline = None
+            draw_run.save()
+            enqueue_draw_exchange_task(exchange, draw_run=draw_run)
+            return
+
+        logger.warning(
+            "Ran out of time drawing %s. Using the best result so far, with score %d.",
+            exchange,
+            draw_run.score,
+        )
+        models.Draw.objects.bulk_create_from_checkpoint(draw_run)
+
+    _drawn(exchange)
+
+
+def _drawn(exchange):
+    """Send draw emails once an exchange is drawn, if it sends emails."""
 
     if exchange.send_emails:
         send_draw_emails.delay(exchange.id)
 
 
+def _batches(queryset):
+    """Stream the IDs in a queryset in lists of up to EMAIL_BATCH_SIZE."""
+
+    batch = []
+    for obj_id in (
+        queryset.order_by("id")
+        .values_list("id", flat=True)
+        .iterator(chunk_size=settings.EMAIL_BATCH_SIZE)
+    ):
+        batch.append(obj_id)
+        if len(batch) >= settings.EMAIL_BATCH_SIZE:
+            yield batch
+            batch = []
+
+    if batch:
+        yield batch
+
+
+def _provider_id(message, address):
+    """Get the ID the email provider gave to a message to an address, if any."""
+
+    anymail_status = getattr(message, "anymail_status", None)
+    if anymail_status is None:
+        return ""
+
+    message_id = getattr(anymail_status.recipients.get(address), "message_id", None)
+    return "" if message_id is None else str(message_id)
+
+
+def _send_messages(email_sends_and_messages):
+    """
+    Send email messages and record the results in the send ledger.
+
+    Takes a list of tuples of the EmailSends each message is for, in the same order as
+    the message's recipients, and the message, or None if there's nothing to send.
+    The EmailSends must have been claimed. The results are recorded together once the
+    batch is finished or interrupted, and claims on emails which weren't sent are
+    released.
+
+    Batches are sent from their own tasks, so messages are sent straight through this
+    process's mailer rather than being queued again by EMAIL_BACKEND.
+    """
+
+    mailer = outbound.get_mailer()
+    sent = mailer.metrics.sent
+    seconds = mailer.metrics.seconds
+    sent_email_sends = []
+    failed_email_sends = []
+    try:
+        for email_sends, message in email_sends_and_messages:
+            for email_send in email_sends:
+                email_send.attempts += 1
+                email_send.updated = now()
+
+            if message is None:
+                for email_send in email_sends:
+                    email_send.status = models.EmailSend.Status.FAILED
+                    email_send.error = "Nothing to send."
+                failed_email_sends.extend(email_sends)
+
+            elif _send_message(mailer, email_sends, message):
+                sent_email_sends.extend(email_sends)
+
+            else:
+                failed_email_sends.extend(email_sends)
+
+    finally:
+        _record_results(email_sends_and_messages, sent_email_sends, failed_email_sends)
+
+        sent = mailer.metrics.sent - sent
+        seconds = mailer.metrics.seconds - seconds
+        logger.info(
+            "Sent %d messages in %f seconds (%f messages per second). This process "
+            "has sent %d messages at %f messages per second, with %d retries, %d "
+            "failures and %f seconds throttled.",
+            sent,
+            seconds,
+            sent / seconds if seconds else 0,
+            mailer.metrics.sent,
+            mailer.metrics.messages_per_second,
+            mailer.metrics.retries,
+            mailer.metrics.failed,
+            mailer.metrics.throttled_seconds,
+        )
+
+
+def _send_message(mailer, email_sends, message):
+    """
+    Send a message through mailer and set the result on its EmailSends.
+
+    Returns whether the message was sent.
+    """
+
+    try:
+        mailer.send(message)
+    except SoftTimeLimitExceeded:
+        raise
+    except Exception as exception:  # pylint: disable=broad-except
+        logger.exception("Failed to send %d emails.", len(email_sends))
+        for email_send in email_sends:
+            email_send.status = models.EmailSend.Status.FAILED
+            email_send.error = str(exception)
+        return False
+
+    for email_send, address in zip(email_sends, message.to):
+        email_send.status = models.EmailSend.Status.SENT
+        email_send.sent = now()
+        email_send.error = ""
+        email_send.provider_id = _provider_id(message, address)
+    return True
+
+
+def _record_results(email_sends_and_messages, sent_email_sends, failed_email_sends):
+    """
+    Record a batch's sent and failed EmailSends, and release the rest.
+
+    Sent and failed EmailSends are each updated with one query.
+    """
+
+    models.EmailSend.objects.bulk_update(
+        sent_email_sends,
+        ["status", "attempts", "provider_id", "error", "sent", "updated"],
+    )
+    models.EmailSend.objects.bulk_update(
+        failed_email_sends, ["status", "attempts", "error", "updated"]
+    )
+
+    recorded = {email_send.id for email_send in sent_email_sends + failed_email_sends}
+    unrecorded = [
+        email_send
+        for email_sends, _ in email_sends_and_messages
+        for email_send in email_sends
+        if email_send.id not in recorded
+    ]
+    if unrecorded:
+        models.EmailSend.objects.release(unrecorded)
+
+
+def _rendered_messages(kind, email_templates, recipients):
+    """
+    Render a message of a kind for each recipient.
+
+    recipients is a list of tuples of each EmailSend, the draw or user in exchange
+    it's about, or None if that's missing, and context data for it, if it's known.
+    """
+
+    renderer = emails.EmailRenderer(email_templates[kind])
+    return [
+        (
+            [email_send],
+            obj.as_email_message(kind, renderer=renderer, context=context)
+            if obj
+            else None,
+        )
+        for email_send, obj, context in recipients
+    ]
+
+
+def _merged_messages(kind, recipients):
+    """
+    Build messages of a kind which use a template on the email provider.
+
+    Each message goes to up to EMAIL_PROVIDER_BATCH_SIZE recipients in the same
+    exchange, with merge data for each of them, and is sent with one API call.
+
+    recipients is as for _rendered_messages.
+    """
+
+    messages = []
+    recipients_by_exchange = defaultdict(list)
+    for email_send, obj, context in recipients:
+        if obj is None:
+            messages.append(([email_send], None))
+        else:
+            recipients_by_exchange[obj.exchange].append((email_send, obj, context))
+
+    for exchange, exchange_recipients in recipients_by_exchange.items():
+        merge_global_data = emails.get_exchange_merge_data(exchange)
+        for start in range(
+            0, len(exchange_recipients), settings.EMAIL_PROVIDER_BATCH_SIZE
+        ):
+            batch = exchange_recipients[
+                start : start + settings.EMAIL_PROVIDER_BATCH_SIZE
+            ]
+            message = AnymailMessage(
+                from_email=settings.DEFAULT_FROM_EMAIL,
+                to=[obj.email_address for _, obj, _ in batch],
+            )
+            message.template_id = settings.EMAIL_PROVIDER_TEMPLATES[kind]
+            message.merge_global_data = merge_global_data
+            message.merge_data = {
+                obj.email_address: obj.get_email_merge_data(context=context)
+                for _, obj, context in batch
+            }
+            messages.append(([email_send for email_send, _, _ in batch], message))
+
+    return messages
+
+
+def _messages(kind, email_templates, recipients):
+    """
+    Build messages of a kind for recipients, as for _rendered_messages.
+
+    Kinds of email with a template in EMAIL_PROVIDER_TEMPLATES are sent in batches
+    using that template. Others are rendered here.
+    """
+
+    if kind in settings.EMAIL_PROVIDER_TEMPLATES:
+        return _merged_messages(kind, recipients)
+
+    return _rendered_messages(kind, email_templates, recipients)
+
+
+def _send_in_batches(exchange, kind, user_ids, batch_task):
+    """
+    Record emails of a kind to users in the send ledger, then send unsent emails.
+
+    Unsent emails are sent in batches, each in its own batch_task.
+    """
+
+    models.EmailSend.objects.bulk_create_for_users(exchange, kind, user_ids.iterator())
+    for batch in _batches(
+        models.EmailSend.objects.unsent().filter(exchange=exchange, kind=kind)
+    ):
+        batch_task.delay(kind, batch)
+
+
+@celery.app.task
+def send_user_in_exchange_email_batch(kind, email_send_ids):
+    """
+    Send a batch of emails to users in an exchange.
+
+    kind is one of UserInExchange.email_templates. Emails which have already been sent,
+    or are being sent by another task, are skipped.
+    """
+
+    email_sends = models.EmailSend.objects.claim(email_send_ids)
+    users_in_exchange = {
+        (user_in_exchange.exchange_id, user_in_exchange.user_id): user_in_exchange
+        for user_in_exchange in models.UserInExchange.objects.filter(
+            exchange_id__in={email_send.exchange_id for email_send in email_sends},
+            user_id__in=[email_send.user_id for email_send in email_sends],
+        ).select_related("user", "exchange")
+    }
+
+    _send_messages(
+        _messages(
+            kind,
+            models.UserInExchange.email_templates,
+            [
+                (
+                    email_send,
+                    users_in_exchange.get((email_send.exchange_id, email_send.user_id)),
+                    None,
+                )
+                for email_send in email_sends
+            ],
+        )
+    )
+
+
+@celery.app.task
+def send_draw_email_batch(kind, email_send_ids):
+    """
+    Send a batch of emails about draws to their senders.
+
+    kind is one of Draw.email_templates. Emails which have already been sent, or are
+    being sent by another task, are skipped.
+    """
+
+    email_sends = models.EmailSend.objects.claim(email_send_ids)
+    draws = {
+        (draw.exchange_id, draw.sender_id): (draw, context)
+        for draw, context in models.Draw.objects.with_context_data(
+            models.Draw.objects.filter(
+                exchange_id__in={email_send.exchange_id for email_send in email_sends},
+                sender_id__in=[email_send.user_id for email_send in email_sends],
+            )
+        )
+    }
+
+    _send_messages(
+        _messages(
+            kind,
+            models.Draw.email_templates,
+            [
+                (email_send,)
+                + draws.get((email_send.exchange_id, email_send.user_id), (None, None))
+                for email_send in email_sends
+            ],
+        )
+    )
+
+
 @celery.app.task
 def send_confirmation_emails(exchange_id):
     """Send confirmation emails for an exchange."""
 
     exchange = models.Exchange.objects.get(id=exchange_id)
     if exchange.send_emails:
-        connection = mail.get_connection()
-        connection.send_messages(
-            [
-                u.as_confirmation_email_message()
-                for u in exchange.users_in_exchange.all()
-            ]
+        _send_in_batches(
+            exchange,
+            "confirmation",
+            exchange.users_in_exchange.values_list("user_id", flat=True),
+            send_user_in_exchange_email_batch,
         )
 
 
@@ -94,12 +496,13 @@ def send_confirmation_reminder_emails(exchange_id):
 
     exchange = models.Exchange.objects.get(id=exchange_id)
     if exchange.send_emails:
-        connection = mail.get_connection()
-        connection.send_messages(
-            [
-                u.as_confirmation_reminder_email_message()
-                for u in exchange.users_in_exchange.filter(confirmed=False)
-            ]
+        _send_in_batches(
+            exchange,
+            "confirmation_reminder",
+            exchange.users_in_exchange.filter(confirmed=False).values_list(
+                "user_id", flat=True
+            ),
+            send_user_in_exchange_email_batch,
         )
 
 
@@ -109,9 +512,11 @@ def send_draw_emails(exchange_id):
 
     exchange = models.Exchange.objects.get(id=exchange_id)
     if exchange.send_emails:
-        connection = mail.get_connection()
-        connection.send_messages(
-            [d.as_created_email_message() for d in exchange.draws.all()]
+        _send_in_batches(
+            exchange,
+            "created",
+            exchange.draws.values_list("sender_id", flat=True),
+            send_draw_email_batch,
         )
 
 
@@ -121,12 +526,13 @@ def send_send_reminders(exchange_id):
 
     exchange = models.Exchange.objects.get(id=exchange_id)
     if exchange.send_emails:
-        connection = mail.get_connection()
-        connection.send_messages(
-            [
-                d.as_send_reminder_email_message()
-                for d in exchange.draws.filter(sent__isnull=True)
-            ]
+        _send_in_batches(
+            exchange,
+            "send_reminder",
+            exchange.draws.filter(sent__isnull=True).values_list(
+                "sender_id", flat=True
+            ),
+            send_draw_email_batch,
         )
 
 
@@ -136,10 +542,30 @@ def send_receive_reminders(exchange_id):
 
     exchange = models.Exchange.objects.get(id=exchange_id)
     if exchange.send_emails:
-        connection = mail.get_connection()
-        connection.send_messages(
-            [
-                d.as_receive_reminder_email_message()
-                for d in exchange.draws.filter(sent__isnull=True)
-            ]
+        _send_in_batches(
+            exchange,
+            "receive_reminder",
+            # Received is marked on the draw of the user who received their mail, as
+            # its sender.
+            exchange.draws.filter(received__isnull=True).values_list(
+                "sender_id", flat=True
+            ),
+            send_draw_email_batch,
         )
+
+
+@celery.app.task
+def refresh_stats_snapshot():
+    """Compute a new stats snapshot for the statto page and delete older ones."""
+
+    snapshot = models.StatsSnapshot.objects.create_from_database()
+    models.StatsSnapshot.objects.filter(id__lt=snapshot.id).delete()
+    logger.info("Refreshed stats snapshot for %d users.", snapshot.users)
+
+
+@celery.app.task
+def rollup_daily_stats():
+    """Roll up today's counts of users and draws for statto's trends."""
+
+    rollups = models.DailyRollup.objects.rollup()
+    logger.info("Created %d daily rollups.", len(rollups))
@@ -7,11 +7,20 @@ from datetime import timedelta
 from django.utils.timezone import now
 
 import pytest
+from allauth.account.models import EmailAddress
 from model_bakery import baker
 
 from af_gang_mail import models
 
 
+@pytest.fixture(autouse=True)
+def email_backend(settings):
+    """Send emails from batch tasks to the test outbox, as fast as possible."""
+
+    settings.CELERY_EMAIL_BACKEND = "django.core.mail.backends.locmem.EmailBackend"
+    settings.EMAIL_RATE_LIMIT = 0
+
+
 @pytest.fixture
 def past_exchanges():
     """Exchanges in the past."""
@@ -120,3 +129,32 @@ def other_upcoming_exchanges():
         )
 
     return models.Exchange.objects.filter(id__in=[e.id for e in exchanges])
+
+
+@pytest.fixture
+def add_users():
+    """Add a number of eligible users to an exchange."""
+
+    def add_users(exchange, confirmed=True, num_users=5):
+        users = []
+        for _ in range(num_users):
+            user = baker.make(
+                "af_gang_mail.User",
+                emailaddress_set=baker.prepare(
+                    EmailAddress, verified=True, _quantity=1
+                ),
+                _fill_optional=["first_name", "last_name"],
+            )
+            user.exchanges.add(exchange, through_defaults={"confirmed": confirmed})
+            users.append(user)
+
+        return users
+
+    return add_users
+
+
+@pytest.fixture
+def confirmed_users(exchange, add_users):
+    """A number of eligible users who've confirmed they're in exchange."""
+
+    return add_users(exchange)
@@ -0,0 +1,38 @@
+"""Test the benchmark-draw command."""
+
+import json
+from io import StringIO
+
+from django.core.management import call_command
+
+import pytest
+
+from af_gang_mail import models
+
+
+@pytest.mark.django_db
+def test_benchmark_draw():
+    """Test a result is written for each draw, and everything is rolled back."""
+
+    stdout = StringIO()
+    call_command(
+        "benchmark-draw",
+        num_users=[10],
+        num_past_exchanges=[0, 1],
+        max_attempts=5,
+        seed=1234,
+        stdout=stdout,
+    )
+
+    results = [json.loads(line) for line in stdout.getvalue().splitlines()]
+    assert [
+        (result["num_users"], result["num_past_exchanges"]) for result in results
+    ] == [(10, 0), (10, 1)]
+    for result in results:
+        assert result["score"] == 0
+        assert result["seed"] == 1234
+        assert result["queries"] == 4
+        assert result["peak_memory_bytes"] > 0
+
+    assert not models.Exchange.objects.exists()
+    assert not models.User.objects.exists()
@@ -0,0 +1,268 @@
+"""Test draw engines."""
+
+# pylint: disable=redefined-outer-name
+
+import random
+import signal
+import time
+
+import billiard
+import pytest
+
+from af_gang_mail.draw_engines import (
+    CycleEngine,
+    CycleScorer,
+    ShuffleEngine,
+    cycle_pairs,
+    get_engine_class,
+    parallel_draw,
+    score_cycle,
+)
+
+ENGINES = [CycleEngine, ShuffleEngine]
+
+
+def random_cycles(user_ids, num_cycles):
+    """Generate previous pairs from a number of random cycles."""
+
+    previous_pairs = set()
+    for _ in range(num_cycles):
+        cycle = list(user_ids)
+        random.shuffle(cycle)
+        previous_pairs.update(cycle_pairs(cycle))
+
+    return previous_pairs
+
+
+def assert_is_cycle(cycle, user_ids):
+    """Assert cycle contains each user ID exactly once."""
+
+    assert sorted(cycle) == sorted(user_ids)
+
+
+def test_score_cycle():
+    """Test scoring a cycle."""
+
+    assert score_cycle([1, 2, 3], set()) == 0
+    assert score_cycle([1, 2, 3], {(1, 2)}) == 1
+    assert score_cycle([1, 2, 3], {(1, 2), (3, 1)}) == 2
+    assert score_cycle([1, 2, 3], {(2, 1), (1, 3)}) == 0
+
+
+def test_get_engine_class(settings):
+    """Test the configured engine is used."""
+
+    settings.DRAW_ENGINE = "af_gang_mail.draw_engines.ShuffleEngine"
+    assert get_engine_class() is ShuffleEngine
+
+
+@pytest.mark.parametrize("engine_class", ENGINES)
+def test_no_previous_pairs(engine_class):
+    """Test a draw with no history is perfect."""
+
+    user_ids = list(range(1, 101))
+    cycle, score = engine_class(set()).draw(user_ids, max_attempts=1)
+    assert_is_cycle(cycle, user_ids)
+    assert score == 0
+
+
+@pytest.mark.parametrize("engine_class", ENGINES)
+def test_one_perfect_solution(engine_class):
+    """Test a draw with only one perfect solution finds it."""
+
+    cycle, score = engine_class({(1, 2), (2, 3), (3, 1)}).draw([1, 2, 3], 1000)
+    assert_is_cycle(cycle, [1, 2, 3])
+    assert score == 0
+    assert set(cycle_pairs(cycle)) == {(1, 3), (3, 2), (2, 1)}
+
+
+@pytest.mark.parametrize("engine_class", ENGINES)
+def test_impossible_draw(engine_class):
+    """Test an impossible draw still gives a result."""
+
+    previous_pairs = {(1, 2), (2, 3), (3, 1), (1, 3), (3, 2), (2, 1)}
+    cycle, score = engine_class(previous_pairs).draw([1, 2, 3], max_attempts=3)
+    assert_is_cycle(cycle, [1, 2, 3])
+    assert score == 3
+
+
+def test_cycle_engine_with_history():
+    """Test the cycle engine finds a perfect draw first time with lots of history."""
+
+    user_ids = list(range(1, 1001))
+    previous_pairs = random_cycles(user_ids, 10)
+    cycle, score = CycleEngine(previous_pairs).draw(user_ids, max_attempts=1)
+    assert_is_cycle(cycle, user_ids)
+    assert score == score_cycle(cycle, previous_pairs) == 0
+
+
+def test_cycle_engine_with_dense_history():
+    """Test the cycle engine finds a perfect draw when most pairs are repeats."""
+
+    # Each user has only ever not sent to the next two users.
+    user_ids = list(range(0, 10))
+    previous_pairs = {
+        (sender_id, recipient_id)
+        for sender_id in user_ids
+        for recipient_id in user_ids
+        if (recipient_id - sender_id) % 10 not in (1, 2)
+    }
+    cycle, score = CycleEngine(previous_pairs).draw(user_ids, max_attempts=10)
+    assert_is_cycle(cycle, user_ids)
+    assert score == score_cycle(cycle, previous_pairs) == 0
+
+
+@pytest.mark.parametrize("engine_class", ENGINES)
+def test_seed(engine_class):
+    """Test draws with the same seed are the same."""
+
+    user_ids = list(range(1, 101))
+    previous_pairs = random_cycles(user_ids, 5)
+    engine = engine_class(previous_pairs, seed=1234)
+    cycle, score = engine.draw(user_ids, max_attempts=3)
+    other_engine = engine_class(previous_pairs, seed=1234)
+    assert other_engine.draw(user_ids, max_attempts=3) == (cycle, score)
+    assert [attempt_score for attempt_score, _ in engine.attempts] == [
+        attempt_score for attempt_score, _ in other_engine.attempts
+    ]
+
+
+@pytest.mark.parametrize("num_users", [3, 4, 5, 50])
+def test_cycle_scorer_moves(num_users):
+    """Test the change in score from moves matches rescoring the cycle."""
+
+    user_ids = list(range(0, num_users))
+    previous_pairs = random_cycles(user_ids, 2)
+    cycle = list(user_ids)
+    random.shuffle(cycle)
+    scorer = CycleScorer(cycle, previous_pairs)
+    assert scorer.score == score_cycle(cycle, previous_pairs)
+
+    for _ in range(1000):
+        first, second = random.sample(user_ids, 2)
+        if random.random() < 0.5:
+            move = scorer.swap(first, second)
+        elif scorer.recipients[second] != first:
+            move = scorer.relocate(first, second)
+        else:
+            continue
+
+        score = scorer.score
+        delta = scorer.delta(move)
+        scorer.apply(move)
+        cycle = scorer.cycle()
+        assert_is_cycle(cycle, user_ids)
+        assert scorer.score == score + delta == score_cycle(cycle, previous_pairs)
+
+
+@pytest.mark.parametrize("engine_class", ENGINES)
+def test_parallel_draw(engine_class):
+    """Test a draw spread over a number of processes."""
+
+    user_ids = list(range(1, 101))
+    previous_pairs = random_cycles(user_ids, 3)
+    cycle, score, attempts = parallel_draw(
+        engine_class, previous_pairs, user_ids, max_attempts=100, processes=2
+    )
+    assert_is_cycle(cycle, user_ids)
+    assert score == score_cycle(cycle, previous_pairs)
+    assert 1 <= len(attempts) <= 100
+
+
+def test_parallel_impossible_draw():
+    """Test an impossible draw spread over a number of processes gives a result."""
+
+    previous_pairs = {(1, 2), (2, 3), (3, 1), (1, 3), (3, 2), (2, 1)}
+    cycle, score, attempts = parallel_draw(
+        ShuffleEngine, previous_pairs, [1, 2, 3], max_attempts=5, processes=2
+    )
+    assert_is_cycle(cycle, [1, 2, 3])
+    assert score == 3
+    assert [attempt_score for attempt_score, _ in attempts] == [3] * 5
+
+
+class SlowEngine(ShuffleEngine):
+    """An engine whose attempts take far longer than a test."""
+
+    def attempt(self, user_ids):
+        time.sleep(60)
+        return super().attempt(user_ids)
+
+
+def _parallel_draw_score(results):
+    _, score, _ = parallel_draw(
+        ShuffleEngine, set(), [1, 2, 3], max_attempts=2, processes=2
+    )
+    results.put(score)
+
+
+def test_parallel_draw_in_daemonic_process():
+    """Test a draw can be spread over processes from a Celery worker process."""
+
+    context = billiard.get_context()  # pylint: disable=no-member
+    results = context.Queue()
+    process = context.Process(target=_parallel_draw_score, args=(results,), daemon=True)
+    process.start()
+    assert results.get(timeout=30) == 0
+    process.join()
+
+
+def test_parallel_draw_interrupted():
+    """Test processes are terminated without waiting for their attempts."""
+
+    def interrupt(signum, frame):
+        raise TimeoutError()
+
+    previous_handler = signal.signal(signal.SIGALRM, interrupt)
+    signal.setitimer(signal.ITIMER_REAL, 1)
+    start = time.perf_counter()
+    try:
+        with pytest.raises(TimeoutError):
+            parallel_draw(SlowEngine, set(), [1, 2, 3], max_attempts=2, processes=2)
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous_handler)
+
+    assert time.perf_counter() - start < 30
+
+
+def test_on_improvement():
+    """Test each improvement on the best cycle is reported."""
+
+    user_ids = list(range(1, 21))
+    previous_pairs = random_cycles(user_ids, 10)
+    improvements = []
+    engine = ShuffleEngine(previous_pairs, seed=1234)
+    cycle, score = engine.draw(
+        user_ids,
+        max_attempts=20,
+        on_improvement=lambda cycle, score: improvements.append((list(cycle), score)),
+    )
+
+    scores = [improvement_score for _, improvement_score in improvements]
+    assert scores == sorted(set(scores), reverse=True)
+    assert improvements[-1] == (list(cycle), score)
+
+
+@pytest.mark.parametrize("engine_class", ENGINES)
+def test_resume_from_perfect_cycle(engine_class):
+    """Test resuming from a perfect cycle returns it without making any attempts."""
+
+    previous_pairs = {(1, 3), (2, 1), (3, 2)}
+    engine = engine_class(previous_pairs)
+    cycle, score = engine.draw([1, 2, 3], max_attempts=5, initial_cycle=[1, 2, 3])
+    assert list(cycle) == [1, 2, 3]
+    assert score == 0
+    assert not engine.attempts
+
+
+def test_cycle_engine_repairs_initial_cycle():
+    """Test the cycle engine carries on repairing an initial cycle."""
+
+    user_ids = list(range(1, 101))
+    previous_pairs = set(cycle_pairs(user_ids))
+    engine = CycleEngine(previous_pairs, seed=1234)
+    cycle, score = engine.draw(user_ids, max_attempts=1, initial_cycle=user_ids)
+    assert_is_cycle(cycle, user_ids)
+    assert score == 0
+    assert len(engine.attempts) == 1
@@ -0,0 +1,87 @@
+"""Test the SendinBlue email backend."""
+
+# pylint: disable=redefined-outer-name
+
+import json
+
+from django.core import mail
+
+import pytest
+import requests
+from anymail.message import AnymailMessage
+
+
+@pytest.fixture
+def api_requests(monkeypatch, settings):
+    """Requests made to the SendinBlue API, which returns a message ID per version."""
+
+    settings.ANYMAIL = {"SENDINBLUE_API_KEY": "test"}
+    api_requests = []
+
+    def request(self, method, url, **kwargs):
+        # pylint: disable=unused-argument
+        data = json.loads(kwargs["data"])
+        api_requests.append(data)
+        response = requests.Response()
+        response.status_code = 201
+        if "messageVersions" in data:
+            content = {
+                "messageIds": [f"<{ i }>" for i in range(len(data["messageVersions"]))]
+            }
+        else:
+            content = {"messageId": "<single>"}
+
+        response._content = json.dumps(content).encode()  # pylint: disable=W0212
+        return response
+
+    monkeypatch.setattr(requests.Session, "request", request)
+    return api_requests
+
+
+@pytest.fixture
+def connection():
+    return mail.get_connection("af_gang_mail.email_backends.SendinBlueEmailBackend")
+
+
+def test_merge_data(api_requests, connection):
+    """Test merge data is sent as message versions in one request."""
+
+    message = AnymailMessage(
+        from_email="from@example.com", to=["a@example.com", "b@example.com"]
+    )
+    message.template_id = 12
+    message.merge_global_data = {"exchange_name": "Cool"}
+    message.merge_data = {
+        "a@example.com": {"name": "A"},
+        "b@example.com": {"name": "B"},
+    }
+    connection.send_messages([message])
+
+    assert len(api_requests) == 1
+    assert "to" not in api_requests[0]
+    assert api_requests[0]["templateId"] == 12
+    assert api_requests[0]["messageVersions"] == [
+        {
+            "to": [{"email": "a@example.com"}],
+            "params": {"exchange_name": "Cool", "name": "A"},
+        },
+        {
+            "to": [{"email": "b@example.com"}],
+            "params": {"exchange_name": "Cool", "name": "B"},
+        },
+    ]
+    assert message.anymail_status.recipients["a@example.com"].message_id == "<0>"
+    assert message.anymail_status.recipients["b@example.com"].message_id == "<1>"
+
+
+def test_without_merge_data(api_requests, connection):
+    """Test messages without merge data are sent as normal."""
+
+    message = AnymailMessage(
+        from_email="from@example.com", to=["a@example.com"], body="Hi"
+    )
+    connection.send_messages([message])
+
+    assert api_requests[0]["to"] == [{"email": "a@example.com"}]
+    assert "messageVersions" not in api_requests[0]
+    assert message.anymail_status.message_id == "<single>"
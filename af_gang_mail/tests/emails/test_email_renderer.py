@@ -0,0 +1,49 @@
+"""Test EmailRenderer."""
+
+# pylint: disable=redefined-outer-name
+
+from django import urls
+
+import pytest
+from model_bakery import baker
+
+from af_gang_mail.emails import EmailRenderer
+
+
+@pytest.fixture
+def exchange():
+    return baker.make("af_gang_mail.Exchange", name="Really Cool", slug="really-cool")
+
+
+@pytest.mark.django_db
+def test_render(exchange):
+    """Test rendering an email."""
+
+    user = baker.make("af_gang_mail.User", first_name="Dave", last_name="Davidson")
+    renderer = EmailRenderer("af_gang_mail/confirmation-email")
+    msg = renderer.render(exchange, {"user": user}, ["dave@example.com"])
+
+    assert msg.to == ["dave@example.com"]
+    assert "Really Cool" in msg.subject
+    assert (
+        urls.reverse("confirm_participation", kwargs={"slug": exchange.slug})
+        in msg.body
+    )
+    assert msg.alternatives[0][1] == "text/html"
+
+
+@pytest.mark.django_db
+def test_exchange_context_data_computed_once(exchange, monkeypatch):
+    """Test context data for an exchange is only computed once."""
+
+    renderer = EmailRenderer("af_gang_mail/confirmation-email")
+    users = baker.make("af_gang_mail.User", _quantity=3)
+    calls = []
+    monkeypatch.setattr(
+        "af_gang_mail.emails.get_exchange_context_data",
+        lambda exchange, site: calls.append(exchange) or {"exchange": exchange},
+    )
+    for user in users:
+        renderer.render(exchange, {"user": user}, [user.email])
+
+    assert calls == [exchange]
@@ -0,0 +1,124 @@
+"""Test rolling up daily counts."""
+
+# pylint: disable=redefined-outer-name
+
+from datetime import date, timedelta
+
+from django.utils.timezone import now
+
+import pytest
+from allauth.account.models import EmailAddress
+from model_bakery import baker
+
+from af_gang_mail.models import DailyRollup
+
+
+@pytest.fixture
+def exchange():
+    """An exchange with users in two countries, who've sent and received mail."""
+
+    exchange = baker.make(
+        "af_gang_mail.Exchange", slug="exchange", received=now() + timedelta(days=1)
+    )
+    joe, mark, bob = [
+        baker.make(
+            "af_gang_mail.User",
+            first_name=first_name,
+            address_country=country,
+            emailaddress_set=baker.prepare(EmailAddress, verified=True, _quantity=1),
+        )
+        for first_name, country in [("Joe", "GB"), ("Mark", "GB"), ("Bob", "NZ")]
+    ]
+    joe.exchanges.add(exchange, through_defaults={"confirmed": True})
+    mark.exchanges.add(exchange, through_defaults={"confirmed": True})
+    bob.exchanges.add(exchange, through_defaults={"confirmed": False})
+    baker.make("af_gang_mail.User", address_country="GB")
+
+    baker.make(
+        "af_gang_mail.Draw",
+        exchange=exchange,
+        sender=joe,
+        recipient=bob,
+        sent=now(),
+        received=now(),
+    )
+    baker.make(
+        "af_gang_mail.Draw", exchange=exchange, sender=bob, recipient=mark, sent=now()
+    )
+    baker.make("af_gang_mail.Draw", exchange=exchange, sender=mark, recipient=joe)
+    return exchange
+
+
+@pytest.mark.django_db
+def test_rollup(exchange, django_assert_max_num_queries):
+    """Test counts per exchange and country."""
+
+    with django_assert_max_num_queries(8):
+        DailyRollup.objects.rollup(date(2020, 12, 1))
+
+    rollups = {
+        (rollup.exchange_id, rollup.country.code): rollup
+        for rollup in DailyRollup.objects.filter(date=date(2020, 12, 1))
+    }
+    assert set(rollups) == {
+        (None, "GB"),
+        (None, "NZ"),
+        (exchange.id, "GB"),
+        (exchange.id, "NZ"),
+    }
+
+    assert rollups[(None, "GB")].users == 3
+    assert rollups[(None, "GB")].verified == 2
+    assert rollups[(None, "GB")].eligible == 2
+
+    rollup = rollups[(exchange.id, "GB")]
+    assert (rollup.users, rollup.confirmed, rollup.sent, rollup.received) == (
+        2,
+        2,
+        1,
+        1,
+    )
+    rollup = rollups[(exchange.id, "NZ")]
+    assert (rollup.users, rollup.confirmed, rollup.sent, rollup.received) == (
+        1,
+        0,
+        1,
+        0,
+    )
+
+
+@pytest.mark.django_db
+def test_rollup_replaces_day(exchange):
+    """Test rolling up a day again replaces its rollups."""
+
+    # pylint: disable=unused-argument
+
+    DailyRollup.objects.rollup(date(2020, 12, 1))
+    DailyRollup.objects.rollup(date(2020, 12, 1))
+    DailyRollup.objects.rollup(date(2020, 12, 2))
+
+    assert DailyRollup.objects.filter(date=date(2020, 12, 1)).count() == 4
+    assert DailyRollup.objects.filter(date=date(2020, 12, 2)).count() == 4
+
+
+@pytest.mark.django_db
+def test_trends(exchange):
+    """Test trends total countries for each exchange."""
+
+    DailyRollup.objects.rollup(date(2020, 12, 1))
+    DailyRollup.objects.rollup(date(2020, 12, 2))
+
+    trends = DailyRollup.objects.trends(since=date(2020, 12, 2))
+
+    assert [row["users"] for row in trends[None]] == [4]
+    assert trends[exchange.name] == [
+        {
+            "date": date(2020, 12, 2),
+            "users": 3,
+            "verified": 3,
+            "confirmed": 2,
+            "eligible": 3,
+            "sent": 2,
+            "received": 1,
+        }
+    ]
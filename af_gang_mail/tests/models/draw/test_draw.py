@@ -8,7 +8,8 @@ import pytest
 from allauth.account.models import EmailAddress
 from model_bakery import baker
 
-from af_gang_mail.models import Draw
+from af_gang_mail.draw_engines import cycle_pairs
+from af_gang_mail.models import Draw, DrawOptions, DrawRun
 
 
 @pytest.fixture
@@ -17,66 +18,152 @@ def exchange():
 
 
 @pytest.fixture
-def users(exchange):
-    """A number of confirmed users belonging to exchange."""
-
-    users = []
-    for _ in range(0, 5):
-        user = baker.make(
-            "af_gang_mail.User",
-            emailaddress_set=baker.prepare(EmailAddress, verified=True, _quantity=1),
-            _fill_optional=["first_name", "last_name"],
-        )
-        assert user.has_verified_email_address()
-        user.exchanges.add(exchange, through_defaults={"confirmed": True})
-        users.append(user)
-
-    return users
-
-
-@pytest.fixture
-def unconfirmed_users(exchange):
-    """A number of unconfirmed users belonging to exchange."""
-
-    users = []
-    for _ in range(0, 5):
-        user = baker.make(
-            "af_gang_mail.User",
-            emailaddress_set=baker.prepare(EmailAddress, verified=True, _quantity=1),
-            _fill_optional=["first_name", "last_name"],
-        )
-        assert user.has_verified_email_address()
-        user.exchanges.add(exchange, through_defaults={"confirmed": False})
-        users.append(user)
+def unconfirmed_users(exchange, add_users):
+    """A number of eligible users who haven't confirmed they're in exchange."""
 
-    return users
+    return add_users(exchange, confirmed=False)
 
 
 @pytest.mark.django_db
-def test_draw(exchange, users, unconfirmed_users, django_assert_max_num_queries):
+def test_draw(
+    exchange, confirmed_users, unconfirmed_users, django_assert_max_num_queries
+):
     """Test a simple draw."""
     # pylint: disable=unused-argument
 
-    with django_assert_max_num_queries(2 + len(users)):
+    with django_assert_max_num_queries(4):
         draws = Draw.objects.bulk_create_from_exchange(exchange)
 
-    assert len(draws) == len(users)
+    assert len(draws) == len(confirmed_users)
 
     for draw in draws:
         assert draw.sender != draw.recipient
-        assert draw.sender in users
-        assert draw.recipient in users
+        assert draw.sender in confirmed_users
+        assert draw.recipient in confirmed_users
+
+
+@pytest.mark.django_db
+def test_draw_run(exchange, confirmed_users):
+    """Test a draw is recorded and can be replayed."""
+
+    draws = Draw.objects.bulk_create_from_exchange(exchange, DrawOptions(seed=1234))
+
+    draw_run = DrawRun.objects.get(exchange=exchange)
+    assert draw_run.seed == 1234
+    assert draw_run.engine == "af_gang_mail.draw_engines.CycleEngine"
+    assert draw_run.participant_ids == sorted(user.id for user in confirmed_users)
+    assert draw_run.score == 0
+    assert len(draw_run.attempts) == 1
+    assert draw_run.finished
+
+    cycle, score, attempts = draw_run.replay()
+    assert score == 0
+    assert len(attempts) == 1
+    assert set(cycle_pairs(cycle)) == {
+        (draw.sender_id, draw.recipient_id) for draw in draws
+    }
+
+
+@pytest.mark.django_db
+def test_draw_in_processes(exchange, confirmed_users):
+    """Test a draw spread over a number of processes."""
+
+    draws = Draw.objects.bulk_create_from_exchange(exchange, DrawOptions(processes=2))
+
+    assert len(draws) == len(confirmed_users)
+    assert {draw.sender for draw in draws} == set(confirmed_users)
+    assert {draw.recipient for draw in draws} == set(confirmed_users)
+
+
+@pytest.mark.django_db
+def test_draw_run_checkpoint(exchange, confirmed_users, settings):
+    """Test the best cycle so far is checkpointed during a draw run."""
+
+    settings.CREATE_DRAW_CHECKPOINT_SECONDS = 0
+    draw_run = DrawRun.objects.prepare(exchange)
+    user_ids = [user.id for user in confirmed_users]
+    draw_run.checkpoint(user_ids, 3)
+
+    draw_run.refresh_from_db()
+    assert draw_run.best_cycle == user_ids
+    assert draw_run.score == 3
+    assert draw_run.checkpointed
+
+
+@pytest.mark.django_db
+def test_draw_run_checkpoint_not_due(exchange, confirmed_users):
+    """Test the best cycle so far isn't saved until a checkpoint is due."""
+
+    draw_run = DrawRun.objects.prepare(exchange)
+    draw_run.checkpoint([user.id for user in confirmed_users], 3)
+    assert draw_run.best_cycle
+    assert not draw_run.pk
+
+
+@pytest.mark.django_db
+def test_resume_draw_run(exchange, confirmed_users):
+    """Test a draw run is resumed from its checkpoint."""
+
+    user_ids = sorted(user.id for user in confirmed_users)
+    draw_run = baker.make(
+        DrawRun,
+        exchange=exchange,
+        engine="af_gang_mail.draw_engines.CycleEngine",
+        participant_ids=user_ids,
+        best_cycle=list(reversed(user_ids)),
+        score=0,
+    )
+    draws = Draw.objects.bulk_create_from_exchange(exchange, draw_run=draw_run)
+
+    assert {(draw.sender_id, draw.recipient_id) for draw in draws} == set(
+        cycle_pairs(list(reversed(user_ids)))
+    )
+    draw_run.refresh_from_db()
+    assert draw_run.best_cycle is None
+    assert draw_run.finished
+
+
+@pytest.mark.django_db
+def test_draw_from_checkpoint(exchange, confirmed_users):
+    """Test draws are created from the checkpoint of an interrupted draw run."""
+
+    user_ids = [user.id for user in confirmed_users]
+    draw_run = baker.make(
+        DrawRun,
+        exchange=exchange,
+        engine="af_gang_mail.draw_engines.CycleEngine",
+        participant_ids=user_ids,
+        best_cycle=user_ids,
+        score=1,
+    )
+    draws = Draw.objects.bulk_create_from_checkpoint(draw_run)
+
+    assert {(draw.sender_id, draw.recipient_id) for draw in draws} == set(
+        cycle_pairs(user_ids)
+    )
+    draw_run.refresh_from_db()
+    assert draw_run.best_cycle is None
+    assert draw_run.finished
 
 
 @pytest.mark.repeat(10)
+@pytest.mark.parametrize(
+    "engine",
+    [
+        "af_gang_mail.draw_engines.CycleEngine",
+        "af_gang_mail.draw_engines.ShuffleEngine",
+    ],
+)
 @pytest.mark.django_db
-def test_draw_with_past_exchange(exchange):
+def test_draw_with_past_exchange(exchange, engine, settings):
     """
     Test a small draw with a past exchange and one perfect solution.
 
     Featuring the Beastie Boys.
     """
 
+    settings.DRAW_ENGINE = engine
+
     past_exchange = baker.make("af_gang_mail.Exchange", slug="past-exchange")
 
     # Set up the Beastie Boys.
@@ -130,7 +217,7 @@ def test_draw_with_past_exchange(exchange):
 
 
 @pytest.mark.django_db
-def test_impossible_draw(exchange):
+def test_impossible_draw(exchange, django_assert_max_num_queries):
     """
     Test an impossible draw will still give a solution.
 
@@ -197,7 +284,11 @@ def test_impossible_draw(exchange):
     )
 
     # Generate a new draw.
-    draws = Draw.objects.bulk_create_from_exchange(exchange, max_attempts=3)
+    # Previous pairs are loaded once, regardless of the number of attempts.
+    with django_assert_max_num_queries(4):
+        draws = Draw.objects.bulk_create_from_exchange(
+            exchange, DrawOptions(max_attempts=3)
+        )
 
     # Test draws were generated.
     assert len(draws) == exchange.users.count() == 3
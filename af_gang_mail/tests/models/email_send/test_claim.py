@@ -0,0 +1,90 @@
+"""Test claiming emails to send."""
+
+# pylint: disable=redefined-outer-name
+
+from datetime import timedelta
+
+from django.utils.timezone import now
+
+import pytest
+from model_bakery import baker
+
+from af_gang_mail.models import EmailSend
+
+
+@pytest.fixture
+def email_sends(settings):
+    """Emails in each state."""
+
+    settings.CELERY_TASK_TIME_LIMIT = 60
+    settings.EMAIL_MAX_ATTEMPTS = 3
+    exchange = baker.make("af_gang_mail.Exchange", slug="my-cool-exchange")
+    users = baker.make("af_gang_mail.User", _quantity=6)
+    email_sends = {
+        "pending": baker.make(EmailSend, exchange=exchange, user=users[0]),
+        "failed": baker.make(
+            EmailSend,
+            exchange=exchange,
+            user=users[1],
+            status=EmailSend.Status.FAILED,
+            attempts=1,
+        ),
+        "given-up": baker.make(
+            EmailSend,
+            exchange=exchange,
+            user=users[2],
+            status=EmailSend.Status.FAILED,
+            attempts=3,
+        ),
+        "sent": baker.make(
+            EmailSend, exchange=exchange, user=users[3], status=EmailSend.Status.SENT
+        ),
+        "sending": baker.make(
+            EmailSend, exchange=exchange, user=users[4], status=EmailSend.Status.SENDING
+        ),
+        "killed": baker.make(
+            EmailSend, exchange=exchange, user=users[5], status=EmailSend.Status.SENDING
+        ),
+    }
+    # updated is set whenever an email is saved.
+    EmailSend.objects.filter(id=email_sends["killed"].id).update(
+        updated=now() - timedelta(seconds=61)
+    )
+    return email_sends
+
+
+@pytest.mark.django_db
+def test_claim(email_sends):
+    """Test unsent emails are claimed, including those of killed tasks."""
+
+    claimed = EmailSend.objects.claim(
+        [email_send.id for email_send in email_sends.values()]
+    )
+
+    expected = {email_sends[name].id for name in ["pending", "failed", "killed"]}
+    assert {email_send.id for email_send in claimed} == expected
+    assert set(
+        EmailSend.objects.filter(status=EmailSend.Status.SENDING).values_list(
+            "id", flat=True
+        )
+    ) == expected | {email_sends["sending"].id}
+
+
+@pytest.mark.django_db
+def test_claim_twice(email_sends):
+    """Test emails are only claimed once."""
+
+    email_send_ids = [email_send.id for email_send in email_sends.values()]
+    EmailSend.objects.claim(email_send_ids)
+
+    assert EmailSend.objects.claim(email_send_ids) == []
+
+
+@pytest.mark.django_db
+def test_release(email_sends):
+    """Test released emails can be claimed again."""
+
+    claimed = EmailSend.objects.claim([email_sends["pending"].id])
+    EmailSend.objects.release(claimed)
+
+    assert EmailSend.objects.claim([email_sends["pending"].id]) == claimed
@@ -0,0 +1,60 @@
+"""Test exchange manager queries use indexes."""
+
+from datetime import timedelta
+
+from django.db import connection
+from django.utils.timezone import now
+
+import pytest
+from model_bakery import baker
+
+from af_gang_mail.models import Exchange
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize(
+    "method,index",
+    [
+        ("scheduled_for_confirmation", "scheduled_for_confirmation"),
+        ("scheduled_for_confirmation_reminder", "scheduled_for_conf_reminder"),
+        ("scheduled_for_draw", "scheduled_for_draw"),
+        ("scheduled_for_send_reminder", "scheduled_for_send_reminder"),
+        ("scheduled_for_receive_reminder", "scheduled_for_recv_reminder"),
+        ("upcoming", "exchange_drawn_sent"),
+        ("not_upcoming", "exchange_drawn_sent"),
+        ("drawn_not_sent", "exchange_drawn_sent"),
+        ("past", "exchange_received"),
+    ],
+)
+def test_uses_index(method, index):
+    """
+    Test the exchange manager's querysets use an index, ordering included.
+
+    On SQLite the index must be searched and return rows in order without a sort.
+    PostgreSQL would read a table this small sequentially, so sequential scans are
+    turned off there, which only shows the index can be used for the queryset, not
+    that the planner would choose it.
+    """
+
+    for i in range(0, 10):
+        baker.make(
+            "af_gang_mail.Exchange",
+            slug=f"exchange-{ i }",
+            confirmation=now() - timedelta(days=i),
+            confirmation_reminder=now() - timedelta(days=i),
+            drawn=now() - timedelta(days=i),
+            sent=now() - timedelta(days=i),
+            received=now() - timedelta(days=i),
+        )
+
+    queryset = getattr(Exchange.objects, method)()
+    if connection.vendor == "postgresql":
+        with connection.cursor() as cursor:
+            cursor.execute("SET LOCAL enable_seqscan = off")
+        plan = queryset.explain()
+        assert "Seq Scan" not in plan
+        assert index in plan
+    else:
+        plan = queryset.explain()
+        assert f"SEARCH af_gang_mail_exchange USING INDEX { index } " in plan
+        assert "USE TEMP B-TREE" not in plan
@@ -0,0 +1,112 @@
+"""Test creating stats snapshots."""
+
+# pylint: disable=redefined-outer-name
+
+from datetime import timedelta
+
+from django.utils.timezone import now
+
+import pytest
+from allauth.account.models import EmailAddress
+from model_bakery import baker
+
+from af_gang_mail.models import StatsSnapshot
+
+
+@pytest.fixture
+def exchange():
+    """An exchange with four users in it."""
+
+    exchange = baker.make(
+        "af_gang_mail.Exchange",
+        name="Cool Exchange",
+        slug="cool-exchange",
+        received=now() + timedelta(days=1),
+    )
+    users = [
+        # Eligible and confirmed, with two verified email addresses.
+        baker.make(
+            "af_gang_mail.User",
+            first_name="Joe",
+            address_country="GB",
+            emailaddress_set=baker.prepare(EmailAddress, verified=True, _quantity=2),
+        ),
+        # Eligible.
+        baker.make(
+            "af_gang_mail.User",
+            last_name="Talbot",
+            address_country="GB",
+            emailaddress_set=baker.prepare(EmailAddress, verified=True, _quantity=1),
+        ),
+        # Unverified.
+        baker.make(
+            "af_gang_mail.User",
+            first_name="Mark",
+            address_country="NZ",
+            emailaddress_set=baker.prepare(EmailAddress, verified=False, _quantity=1),
+        ),
+        # No name.
+        baker.make(
+            "af_gang_mail.User",
+            first_name="",
+            last_name="",
+            address_country="NZ",
+            emailaddress_set=baker.prepare(EmailAddress, verified=True, _quantity=1),
+        ),
+    ]
+    for i, user in enumerate(users):
+        user.exchanges.add(exchange, through_defaults={"confirmed": i == 0})
+
+    return exchange
+
+
+@pytest.mark.django_db
+def test_create_from_database(exchange, django_assert_max_num_queries):
+    """Test stats are computed in a fixed number of queries."""
+
+    # pylint: disable=unused-argument
+
+    baker.make(
+        "af_gang_mail.Exchange",
+        name="Empty Exchange",
+        slug="empty-exchange",
+        received=now() + timedelta(days=1),
+    )
+    baker.make(
+        "af_gang_mail.Exchange",
+        name="Past Exchange",
+        slug="past-exchange",
+        received=now() - timedelta(days=1),
+    )
+
+    with django_assert_max_num_queries(6):
+        snapshot = StatsSnapshot.objects.create_from_database()
+
+    snapshot.refresh_from_db()
+    percentages = dict(snapshot.percentages)
+    assert snapshot.users == 4
+    assert percentages["Users with Verified Email"] == 75
+    assert percentages["Users with First Name"] == 50
+    assert percentages["Users with Address Country"] == 100
+    assert percentages["Users in United Kingdom"] == 50
+    assert percentages["Users in New Zealand"] == 50
+    assert percentages["Users in Cool Exchange"] == 100
+    assert percentages["Eligible Users in Cool Exchange"] == 50
+    assert percentages["Users confirmed for Cool Exchange"] == 25
+    assert (
+        percentages["Users ineligible due to unverified email in Cool Exchange"] == 25
+    )
+    assert percentages["Users ineligible due to missing name in Cool Exchange"] == 25
+    assert percentages["Users in Empty Exchange"] == 0
+    assert "Eligible Users in Empty Exchange" not in percentages
+    assert "Users in Past Exchange" not in percentages
+
+
+@pytest.mark.django_db
+def test_create_from_database_without_users():
+    """Test there are no percentages without users."""
+
+    snapshot = StatsSnapshot.objects.create_from_database()
+
+    assert snapshot.users == 0
+    assert snapshot.percentages == []
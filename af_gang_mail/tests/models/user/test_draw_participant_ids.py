@@ -0,0 +1,54 @@
+"""Test draw_participant_ids."""
+
+# pylint: disable=redefined-outer-name
+
+import pytest
+from allauth.account.models import EmailAddress
+from model_bakery import baker
+
+from af_gang_mail.models import User
+
+
+@pytest.fixture
+def exchange():
+    return baker.make("af_gang_mail.Exchange", slug="my-cool-exchange")
+
+
+def make_user(exchange, confirmed=True, verified=True, **kwargs):
+    """Make a user in an exchange."""
+
+    user = baker.make(
+        "af_gang_mail.User",
+        emailaddress_set=baker.prepare(EmailAddress, verified=verified, _quantity=1),
+        _fill_optional=["first_name", "last_name"],
+        **kwargs,
+    )
+    user.exchanges.add(exchange, through_defaults={"confirmed": confirmed})
+    return user
+
+
+@pytest.mark.django_db
+def test_draw_participant_ids(exchange, django_assert_num_queries):
+    """Test getting the IDs of users taking part in a draw."""
+
+    participants = [make_user(exchange) for _ in range(0, 3)]
+    make_user(exchange, confirmed=False)
+    make_user(exchange, verified=False)
+    make_user(exchange, first_name="", last_name="")
+    make_user(exchange, is_active=False)
+    make_user(baker.make("af_gang_mail.Exchange", slug="other-exchange"))
+
+    with django_assert_num_queries(1):
+        user_ids = User.objects.draw_participant_ids(exchange)
+
+    assert user_ids == sorted(user.id for user in participants)
+
+
+@pytest.mark.django_db
+def test_multiple_verified_email_addresses(exchange):
+    """Test users with more than one verified email address only appear once."""
+
+    user = make_user(exchange)
+    baker.make(EmailAddress, user=user, verified=True)
+
+    assert User.objects.draw_participant_ids(exchange) == [user.id]
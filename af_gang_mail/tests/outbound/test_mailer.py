@@ -0,0 +1,153 @@
+"""Test Mailer."""
+
+# pylint: disable=redefined-outer-name
+
+import smtplib
+
+from django.core import mail
+from django.core.mail.backends import locmem
+
+import pytest
+import requests
+from anymail.exceptions import AnymailRequestsAPIError
+
+from af_gang_mail.outbound import Mailer, retry_after
+
+
+class FlakyBackend:
+    """Patches the locmem backend to raise queued exceptions before sending."""
+
+    def __init__(self):
+        self.exceptions = []
+        self.opened = 0
+        self.connection = locmem.EmailBackend()
+
+    def open(self):
+        """Count connections opened."""
+
+        self.opened += 1
+
+    def send_messages(self, messages):
+        """Raise the next queued exception, or send messages if there are none."""
+
+        if self.exceptions:
+            raise self.exceptions.pop(0)
+
+        return send_messages(self.connection, messages)
+
+
+send_messages = locmem.EmailBackend.send_messages
+
+
+@pytest.fixture
+def backend(monkeypatch):
+    """A flaky backend patched into the locmem backend."""
+
+    backend = FlakyBackend()
+    monkeypatch.setattr(locmem.EmailBackend, "open", backend.open, raising=False)
+    monkeypatch.setattr(locmem.EmailBackend, "send_messages", backend.send_messages)
+    return backend
+
+
+@pytest.fixture
+def sleeps():
+    """Seconds the mailer sleeps for."""
+
+    return []
+
+
+@pytest.fixture
+def mailer(backend, sleeps):
+    """A mailer which retries twice."""
+
+    # pylint: disable=unused-argument
+    return Mailer(
+        "django.core.mail.backends.locmem.EmailBackend",
+        retries=2,
+        backoff_seconds=1,
+        sleep=sleeps.append,
+    )
+
+
+def too_many_requests(retry_after_header=None):
+    """Make an API error saying there have been too many requests."""
+
+    response = requests.Response()
+    response.status_code = 429
+    if retry_after_header:
+        response.headers["Retry-After"] = retry_after_header
+
+    return AnymailRequestsAPIError("Too many requests", response=response)
+
+
+def test_connection_is_reused(backend, mailer, mailoutbox):
+    """Test one connection is used for many messages."""
+
+    for _ in range(3):
+        mailer.send(mail.EmailMessage(to=["dave@example.com"]))
+
+    assert len(mailoutbox) == 3
+    assert backend.opened == 1
+    assert mailer.metrics.sent == 3
+
+
+def test_backoff(backend, mailer, sleeps, mailoutbox):
+    """Test temporary failures are retried with exponential backoff."""
+
+    backend.exceptions = [
+        too_many_requests(),
+        smtplib.SMTPResponseException(421, b"Try again later"),
+    ]
+    mailer.send(mail.EmailMessage(to=["dave@example.com"]))
+
+    assert len(mailoutbox) == 1
+    assert sleeps == [1, 2]
+    assert backend.opened == 3
+    assert mailer.metrics.retries == 2
+
+
+def test_retry_after(backend, mailer, sleeps):
+    """Test the provider's Retry-After header is honoured."""
+
+    backend.exceptions = [too_many_requests("7")]
+    mailer.send(mail.EmailMessage(to=["dave@example.com"]))
+
+    assert sleeps == [7]
+
+
+def test_too_many_failures(backend, mailer, mailoutbox):
+    """Test temporary failures are raised once retries run out."""
+
+    backend.exceptions = [too_many_requests() for _ in range(3)]
+    with pytest.raises(AnymailRequestsAPIError):
+        mailer.send(mail.EmailMessage(to=["dave@example.com"]))
+
+    assert not mailoutbox
+    assert mailer.metrics.failed == 1
+
+
+def test_permanent_failure(backend, mailer, sleeps):
+    """Test permanent failures aren't retried."""
+
+    backend.exceptions = [smtplib.SMTPResponseException(550, b"No such user")]
+    with pytest.raises(smtplib.SMTPResponseException):
+        mailer.send(mail.EmailMessage(to=["dave@example.com"]))
+
+    assert not sleeps
+
+
+@pytest.mark.parametrize(
+    "exception, expected",
+    [
+        (too_many_requests(), 0),
+        (too_many_requests("3"), 3),
+        (smtplib.SMTPServerDisconnected(), 0),
+        (smtplib.SMTPResponseException(450, b"Mailbox busy"), 0),
+        (smtplib.SMTPResponseException(550, b"No such user"), None),
+        (ValueError(), None),
+    ],
+)
+def test_retry_after_exceptions(exception, expected):
+    """Test which exceptions are temporary."""
+
+    assert retry_after(exception) == expected
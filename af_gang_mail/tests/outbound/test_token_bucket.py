@@ -0,0 +1,62 @@
+"""Test TokenBucket."""
+
+import pytest
+
+from af_gang_mail.outbound import TokenBucket
+
+
+class FakeClock:
+    """A clock which only moves when something sleeps."""
+
+    def __init__(self):
+        self.time = 0
+
+    def __call__(self):
+        return self.time
+
+    def sleep(self, seconds):
+        self.time += seconds
+
+
+def test_burst():
+    """Test a full bucket allows a burst without waiting."""
+
+    clock = FakeClock()
+    bucket = TokenBucket(2, 5, clock=clock, sleep=clock.sleep)
+    assert [bucket.take() for _ in range(5)] == [0] * 5
+
+
+def test_rate():
+    """Test an empty bucket limits the rate."""
+
+    clock = FakeClock()
+    bucket = TokenBucket(2, 5, clock=clock, sleep=clock.sleep)
+    for _ in range(5):
+        bucket.take()
+
+    for _ in range(10):
+        assert bucket.take() == pytest.approx(0.5)
+
+    assert clock.time == pytest.approx(5)
+
+
+def test_refill():
+    """Test the bucket refills over time, up to its capacity."""
+
+    clock = FakeClock()
+    bucket = TokenBucket(2, 5, clock=clock, sleep=clock.sleep)
+    for _ in range(5):
+        bucket.take()
+
+    clock.time += 100
+    assert [bucket.take() for _ in range(5)] == [0] * 5
+    assert bucket.take() == pytest.approx(0.5)
+
+
+def test_unlimited():
+    """Test a bucket without a rate never waits."""
+
+    clock = FakeClock()
+    bucket = TokenBucket(None, 1, clock=clock, sleep=clock.sleep)
+    assert [bucket.take() for _ in range(5)] == [0] * 5
+    assert clock.time == 0
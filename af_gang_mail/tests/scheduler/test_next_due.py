@@ -0,0 +1,65 @@
+"""Test finding when the next phase is due."""
+
+from datetime import timedelta
+
+from django.utils import timezone
+
+import pytest
+from model_bakery import baker
+
+from af_gang_mail import scheduler
+
+
+@pytest.mark.django_db
+def test_next_due():
+    """Test the earliest unclaimed phase is found."""
+
+    now = timezone.now()
+    baker.make(
+        "af_gang_mail.Exchange",
+        slug="started",
+        confirmation=now + timedelta(hours=1),
+        confirmation_started=now,
+        drawn=now + timedelta(days=1),
+        sent=now + timedelta(days=2),
+        received=now + timedelta(days=3),
+    )
+    baker.make(
+        "af_gang_mail.Exchange",
+        slug="later",
+        confirmation_reminder=now + timedelta(hours=2),
+        drawn=now + timedelta(days=1),
+        sent=now + timedelta(days=2),
+        received=now + timedelta(days=3),
+    )
+
+    assert scheduler.next_due() == now + timedelta(hours=2)
+
+
+@pytest.mark.django_db
+def test_next_due_nothing_scheduled():
+    """Test nothing is due when every phase has started."""
+
+    now = timezone.now()
+    baker.make(
+        "af_gang_mail.Exchange",
+        slug="finished",
+        drawn=now,
+        sent=now,
+        received=now,
+        draw_started=now,
+        send_reminder_started=now,
+        receive_reminder_started=now,
+    )
+
+    assert scheduler.next_due() is None
+
+
+def test_seconds_until():
+    """Test sleeps are capped and never shorter than a second."""
+
+    now = timezone.now()
+    assert scheduler.seconds_until(now + timedelta(seconds=30), now, 60) == 30
+    assert scheduler.seconds_until(now + timedelta(hours=1), now, 60) == 60
+    assert scheduler.seconds_until(now - timedelta(hours=1), now, 60) == 1
+    assert scheduler.seconds_until(None, now, 60) == 60
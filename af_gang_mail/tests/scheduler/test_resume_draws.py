@@ -0,0 +1,89 @@
+"""Test resuming draw runs which were killed."""
+
+# pylint: disable=redefined-outer-name
+
+from datetime import timedelta
+
+from django.utils.timezone import now
+
+import pytest
+from model_bakery import baker
+
+from af_gang_mail import scheduler, tasks
+
+
+@pytest.fixture
+def enqueued(monkeypatch):
+    """IDs of draw runs which are enqueued."""
+
+    enqueued = []
+
+    def enqueue_draw_exchange_task(exchange, draw_run=None):
+        assert exchange == draw_run.exchange
+        enqueued.append(draw_run.id)
+
+    monkeypatch.setattr(tasks, "enqueue_draw_exchange_task", enqueue_draw_exchange_task)
+    return enqueued
+
+
+@pytest.fixture
+def draw_runs(settings):
+    """Draw runs in each state."""
+
+    settings.CREATE_DRAW_MAX_RESUMES = 2
+    exchange = baker.make("af_gang_mail.Exchange", slug="my-cool-exchange")
+    past = now() - timedelta(minutes=1)
+    return {
+        "killed": baker.make("af_gang_mail.DrawRun", exchange=exchange, deadline=past),
+        "killed-with-checkpoint": baker.make(
+            "af_gang_mail.DrawRun",
+            exchange=exchange,
+            best_cycle=[1, 2, 3],
+            resumes=2,
+            deadline=past,
+        ),
+        "killed-too-often": baker.make(
+            "af_gang_mail.DrawRun", exchange=exchange, resumes=2, deadline=past
+        ),
+        "running": baker.make(
+            "af_gang_mail.DrawRun",
+            exchange=exchange,
+            deadline=now() + timedelta(minutes=1),
+        ),
+        "queued": baker.make("af_gang_mail.DrawRun", exchange=exchange),
+        "finished": baker.make(
+            "af_gang_mail.DrawRun", exchange=exchange, deadline=past, finished=past
+        ),
+    }
+
+
+@pytest.mark.django_db(transaction=True)
+def test_resume_draws(draw_runs, enqueued):
+    """Test killed draw runs are claimed and enqueued."""
+
+    claimed = scheduler.resume_draws()
+
+    expected = [draw_runs["killed"].id, draw_runs["killed-with-checkpoint"].id]
+    assert sorted(draw_run.id for draw_run in claimed) == sorted(expected)
+    assert sorted(enqueued) == sorted(expected)
+
+    for draw_run in draw_runs.values():
+        draw_run.refresh_from_db()
+
+    assert draw_runs["killed"].deadline is None
+    assert draw_runs["killed"].resumes == 1
+    assert draw_runs["killed-too-often"].deadline is None
+    assert draw_runs["running"].deadline
+
+
+@pytest.mark.django_db(transaction=True)
+def test_resume_draws_twice(draw_runs, enqueued):
+    """Test killed draw runs are only claimed once."""
+
+    # pylint: disable=unused-argument
+
+    scheduler.resume_draws()
+    enqueued.clear()
+
+    assert scheduler.resume_draws() == []
+    assert enqueued == []
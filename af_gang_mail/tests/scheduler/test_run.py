@@ -0,0 +1,171 @@
+"""Test running the scheduler."""
+
+# pylint: disable=redefined-outer-name
+
+from datetime import timedelta
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils.timezone import now
+
+import pytest
+from model_bakery import baker
+
+from af_gang_mail import scheduler, tasks
+
+
+@pytest.fixture
+def enqueued(monkeypatch):
+    """Tasks which are enqueued, as (task name, exchange ID)."""
+
+    enqueued = []
+    for name in [
+        "send_confirmation_emails",
+        "send_confirmation_reminder_emails",
+        "send_send_reminders",
+        "send_receive_reminders",
+    ]:
+        monkeypatch.setattr(
+            getattr(tasks, name),
+            "delay",
+            lambda exchange_id, name=name: enqueued.append((name, exchange_id)),
+        )
+
+    monkeypatch.setattr(
+        tasks.draw_exchange,
+        "apply_async",
+        lambda kwargs, **options: enqueued.append(
+            ("draw_exchange", kwargs["exchange_id"])
+        ),
+    )
+    return enqueued
+
+
+@pytest.fixture
+def exchanges():
+    """Exchanges at each stage."""
+
+    return {
+        "upcoming": baker.make(
+            "af_gang_mail.Exchange",
+            slug="upcoming",
+            confirmation=now() + timedelta(days=1),
+            confirmation_reminder=now() + timedelta(days=2),
+            drawn=now() + timedelta(days=3),
+            sent=now() + timedelta(days=4),
+            received=now() + timedelta(days=5),
+        ),
+        "confirming": baker.make(
+            "af_gang_mail.Exchange",
+            slug="confirming",
+            confirmation=now() - timedelta(days=1),
+            confirmation_reminder=now() + timedelta(days=1),
+            drawn=now() + timedelta(days=2),
+            sent=now() + timedelta(days=3),
+            received=now() + timedelta(days=4),
+        ),
+        "due-for-draw": baker.make(
+            "af_gang_mail.Exchange",
+            slug="due-for-draw",
+            confirmation=now() - timedelta(days=2),
+            confirmation_reminder=now() - timedelta(days=1),
+            confirmation_started=now() - timedelta(days=2),
+            confirmation_reminder_started=now() - timedelta(days=1),
+            drawn=now() - timedelta(minutes=1),
+            sent=now() + timedelta(days=1),
+            received=now() + timedelta(days=2),
+        ),
+        "past": baker.make(
+            "af_gang_mail.Exchange",
+            slug="past",
+            drawn=now() - timedelta(days=3),
+            sent=now() - timedelta(days=2),
+            received=now() - timedelta(days=1),
+        ),
+    }
+
+
+@pytest.mark.django_db(transaction=True)
+def test_run(exchanges, enqueued):
+    """Test every due phase is claimed and enqueued."""
+
+    claimed = scheduler.run()
+
+    assert {(phase.name, exchange.slug) for phase, exchange in claimed} == {
+        ("confirmation", "confirming"),
+        ("draw", "due-for-draw"),
+        ("draw", "past"),
+        ("send reminder", "past"),
+        ("receive reminder", "past"),
+    }
+    assert sorted(enqueued) == sorted(
+        [
+            ("send_confirmation_emails", exchanges["confirming"].id),
+            ("draw_exchange", exchanges["due-for-draw"].id),
+            ("draw_exchange", exchanges["past"].id),
+            ("send_send_reminders", exchanges["past"].id),
+            ("send_receive_reminders", exchanges["past"].id),
+        ]
+    )
+
+    for exchange in exchanges.values():
+        exchange.refresh_from_db()
+
+    assert exchanges["confirming"].confirmation_started
+    assert exchanges["confirming"].confirmation_reminder_started is None
+    assert exchanges["due-for-draw"].draw_started
+    assert exchanges["past"].draw_started
+    assert exchanges["past"].send_reminder_started
+    assert exchanges["past"].receive_reminder_started
+    assert exchanges["upcoming"].confirmation_started is None
+
+
+@pytest.mark.django_db(transaction=True)
+def test_run_twice(exchanges, enqueued):
+    """Test phases are only claimed once."""
+
+    # pylint: disable=unused-argument
+
+    scheduler.run()
+    enqueued.clear()
+
+    assert scheduler.run() == []
+    assert enqueued == []
+
+
+@pytest.mark.django_db(transaction=True)
+def test_run_only_writes_started(exchanges, enqueued):
+    """Test claiming only writes the started columns."""
+
+    # pylint: disable=unused-argument
+
+    updated = exchanges["past"].updated
+
+    with CaptureQueriesContext(connection) as queries:
+        scheduler.run()
+
+    updates = [query["sql"] for query in queries if query["sql"].startswith("UPDATE")]
+    assert len(updates) == 4
+    for sql in updates:
+        assert '"updated"' not in sql
+        assert '"name"' not in sql
+
+    exchanges["past"].refresh_from_db()
+    assert exchanges["past"].updated == updated
+
+
+@pytest.mark.django_db(transaction=True)
+def test_run_rolled_back(exchanges, enqueued, monkeypatch):
+    """Test nothing is enqueued if claiming fails."""
+
+    def update(self, **kwargs):
+        raise RuntimeError("Oh no!")
+
+    monkeypatch.setattr("django.db.models.query.QuerySet.update", update)
+
+    with pytest.raises(RuntimeError):
+        scheduler.run()
+
+    assert enqueued == []
+    exchanges["confirming"].refresh_from_db()
+    assert exchanges["confirming"].confirmation_started is None
@@ -0,0 +1,55 @@
+"""Test running periodic tasks."""
+
+# pylint: disable=redefined-outer-name
+
+from datetime import timedelta
+from types import SimpleNamespace
+
+from django.utils import timezone
+
+import pytest
+
+from af_gang_mail import models, scheduler
+
+
+@pytest.fixture
+def enqueued():
+    """Periodic tasks which are enqueued."""
+
+    return []
+
+
+@pytest.fixture
+def periodic_tasks(settings, enqueued):
+    """A periodic task which is enqueued every ten minutes."""
+
+    settings.STATS_SNAPSHOT_SECONDS = 600
+    return [
+        scheduler.PeriodicTask(
+            "test",
+            "STATS_SNAPSHOT_SECONDS",
+            SimpleNamespace(delay=lambda: enqueued.append("test")),
+        )
+    ]
+
+
+@pytest.mark.django_db(transaction=True)
+def test_run_periodic(periodic_tasks, enqueued):
+    """Test periodic tasks are only enqueued once per interval."""
+
+    assert scheduler.run_periodic(periodic_tasks) == periodic_tasks
+    assert scheduler.run_periodic(periodic_tasks) == []
+    assert enqueued == ["test"]
+
+
+@pytest.mark.django_db(transaction=True)
+def test_run_periodic_after_interval(periodic_tasks, enqueued):
+    """Test periodic tasks are enqueued again once their interval has passed."""
+
+    scheduler.run_periodic(periodic_tasks)
+    models.PeriodicTaskClaim.objects.update(
+        claimed=timezone.now() - timedelta(seconds=601)
+    )
+
+    assert scheduler.run_periodic(periodic_tasks) == periodic_tasks
+    assert enqueued == ["test", "test"]
@@ -0,0 +1,49 @@
+"""Test the run-scheduler command."""
+
+from datetime import timedelta
+
+from django.core.management import call_command
+from django.utils import timezone
+
+import pytest
+from model_bakery import baker
+
+from af_gang_mail import tasks
+
+
+@pytest.mark.django_db(transaction=True)
+def test_run_scheduler(monkeypatch):
+    """Test due tasks are enqueued, then the scheduler sleeps until the next one."""
+
+    now = timezone.now()
+    exchange = baker.make(
+        "af_gang_mail.Exchange",
+        slug="my-cool-exchange",
+        confirmation=now - timedelta(minutes=1),
+        confirmation_reminder=now + timedelta(seconds=30),
+        drawn=now + timedelta(days=1),
+        sent=now + timedelta(days=2),
+        received=now + timedelta(days=3),
+    )
+    enqueued = []
+    monkeypatch.setattr(tasks.send_confirmation_emails, "delay", enqueued.append)
+    monkeypatch.setattr(
+        tasks.refresh_stats_snapshot, "delay", lambda: enqueued.append("stats")
+    )
+    monkeypatch.setattr(
+        tasks.rollup_daily_stats, "delay", lambda: enqueued.append("rollup")
+    )
+
+    sleeps = []
+
+    def sleep(seconds):
+        sleeps.append(seconds)
+        raise KeyboardInterrupt()
+
+    monkeypatch.setattr("time.sleep", sleep)
+
+    call_command("run-scheduler", max_sleep=3600)
+
+    assert enqueued == [exchange.id, "stats", "rollup"]
+    assert len(sleeps) == 1
+    assert 1 <= sleeps[0] <= 30
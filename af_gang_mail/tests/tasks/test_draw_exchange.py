@@ -0,0 +1,157 @@
+"""Test drawing an exchange."""
+
+# pylint: disable=redefined-outer-name
+
+from datetime import timedelta
+
+from django.utils.timezone import now
+
+import pytest
+from celery.exceptions import SoftTimeLimitExceeded
+from model_bakery import baker
+
+from af_gang_mail import draw_engines, tasks
+
+
+@pytest.fixture
+def exchange(add_users):
+    """An exchange with a number of confirmed users, which doesn't send emails."""
+
+    exchange = baker.make(
+        "af_gang_mail.Exchange", slug="my-cool-exchange", send_emails=False
+    )
+    add_users(exchange)
+    return exchange
+
+
+@pytest.fixture
+def enqueued(monkeypatch):
+    """Draw runs which are enqueued to be resumed."""
+
+    enqueued = []
+    monkeypatch.setattr(
+        tasks,
+        "enqueue_draw_exchange_task",
+        lambda exchange, draw_run=None: enqueued.append(draw_run),
+    )
+    return enqueued
+
+
+@pytest.mark.django_db
+def test_draw_exchange(exchange):
+    """Test drawing an exchange."""
+
+    tasks.draw_exchange(exchange.id, max_attempts=10)
+
+    assert exchange.draws.count() == 5
+    assert exchange.draw_runs.get().finished
+
+
+@pytest.mark.django_db
+def test_out_of_time_with_checkpoint(exchange, monkeypatch, enqueued):
+    """Test running out of time creates draws from the best result so far."""
+
+    def run_draw(*args, on_improvement=None, **kwargs):
+        # pylint: disable=unused-argument
+        user_ids = args[2]
+        on_improvement(user_ids, 1)
+        raise SoftTimeLimitExceeded()
+
+    monkeypatch.setattr(draw_engines, "run_draw", run_draw)
+    tasks.draw_exchange(exchange.id, max_attempts=10)
+
+    draw_run = exchange.draw_runs.get()
+    assert exchange.draws.count() == 5
+    assert set(exchange.draws.values_list("sender_id", "recipient_id")) == set(
+        draw_engines.cycle_pairs(draw_run.participant_ids)
+    )
+    assert draw_run.score == 1
+    assert draw_run.finished
+    assert not enqueued
+
+
+@pytest.mark.django_db
+def test_out_of_time_without_checkpoint(exchange, monkeypatch, enqueued, settings):
+    """Test running out of time before finding anything resumes the draw run."""
+
+    def run_draw(*args, **kwargs):
+        raise SoftTimeLimitExceeded()
+
+    monkeypatch.setattr(draw_engines, "run_draw", run_draw)
+    settings.CREATE_DRAW_MAX_RESUMES = 1
+    tasks.draw_exchange(exchange.id, max_attempts=10)
+
+    draw_run = exchange.draw_runs.get()
+    assert not exchange.draws.exists()
+    assert enqueued == [draw_run]
+    assert draw_run.resumes == 1
+    assert not draw_run.finished
+
+    with pytest.raises(SoftTimeLimitExceeded):
+        tasks.draw_exchange(exchange.id, max_attempts=10, draw_run_id=draw_run.id)
+
+    assert len(enqueued) == 1
+
+
+@pytest.mark.django_db
+def test_deadline(exchange, monkeypatch, enqueued):
+    """Test the draw run is saved with when the task will be killed before drawing."""
+
+    deadlines = []
+
+    def run_draw(*args, **kwargs):
+        # pylint: disable=unused-argument
+        deadlines.append(exchange.draw_runs.get().deadline)
+        raise SoftTimeLimitExceeded()
+
+    monkeypatch.setattr(draw_engines, "run_draw", run_draw)
+    tasks.draw_exchange.push_request(timelimit=(60, 30))
+    try:
+        tasks.draw_exchange.run(exchange.id, max_attempts=10)
+    finally:
+        tasks.draw_exchange.pop_request()
+
+    assert now() < deadlines[0] <= now() + timedelta(seconds=60)
+    assert enqueued == [exchange.draw_runs.get()]
+    assert exchange.draw_runs.get().deadline is None
+
+
+@pytest.mark.django_db
+def test_killed_with_checkpoint(exchange, monkeypatch):
+    """Test a draw run killed after checkpointing creates draws from its checkpoint."""
+
+    def run_draw(*args, **kwargs):
+        # pylint: disable=unused-argument
+        raise AssertionError("Drew again.")
+
+    monkeypatch.setattr(draw_engines, "run_draw", run_draw)
+    user_ids = sorted(exchange.users.values_list("id", flat=True))
+    draw_run = baker.make(
+        "af_gang_mail.DrawRun",
+        exchange=exchange,
+        participant_ids=user_ids,
+        best_cycle=user_ids,
+        score=1,
+        deadline=now() - timedelta(minutes=1),
+    )
+    tasks.draw_exchange(exchange.id, max_attempts=10, draw_run_id=draw_run.id)
+
+    draw_run.refresh_from_db()
+    assert set(exchange.draws.values_list("sender_id", "recipient_id")) == set(
+        draw_engines.cycle_pairs(user_ids)
+    )
+    assert draw_run.best_cycle is None
+    assert draw_run.finished
+
+
+@pytest.mark.django_db
+def test_already_drawn(exchange):
+    """Test an exchange which already has draws isn't drawn again."""
+
+    tasks.draw_exchange(exchange.id, max_attempts=10)
+    draws = set(exchange.draws.values_list("sender_id", "recipient_id"))
+
+    tasks.draw_exchange(exchange.id, max_attempts=10)
+
+    assert set(exchange.draws.values_list("sender_id", "recipient_id")) == draws
+    assert all(draw_run.finished for draw_run in exchange.draw_runs.all())
@@ -0,0 +1,92 @@
+"""Test calculating time limits for drawing an exchange."""
+
+# pylint: disable=redefined-outer-name, protected-access
+
+from django.utils.timezone import now
+
+import pytest
+from model_bakery import baker
+
+from af_gang_mail import tasks
+
+
+@pytest.fixture(autouse=True)
+def time_limit_settings(settings):
+    """Time limits which are simple to calculate with."""
+
+    settings.CELERY_TASK_SOFT_TIME_LIMIT = 30
+    settings.CELERY_TASK_TIME_LIMIT = 60
+    settings.CREATE_DRAW_SECONDS_PER_USER = 0.01
+    settings.CREATE_DRAW_TIME_LIMIT_MARGIN = 2
+
+
+@pytest.fixture
+def exchange():
+    """An exchange with 1,000 users, 200 of whom have drawn each other before."""
+
+    exchange = baker.make("af_gang_mail.Exchange", slug="my-cool-exchange")
+    users = baker.make("af_gang_mail.User", _quantity=1000)
+    exchange.users.add(*users)
+
+    past_exchange = baker.make("af_gang_mail.Exchange", slug="past-exchange")
+    for i in range(0, 200):
+        baker.make(
+            "af_gang_mail.Draw",
+            exchange=past_exchange,
+            sender=users[i],
+            recipient=users[(i + 1) % 200],
+        )
+
+    return exchange
+
+
+@pytest.mark.django_db
+def test_without_measurements(exchange):
+    """Test time limits are based on settings without measurements."""
+
+    soft_time_limit, time_limit = tasks._calculate_draw_exchange_time_limits(
+        exchange, max_attempts=10, processes=2
+    )
+    assert soft_time_limit == pytest.approx(1000 * 0.01 * 5)
+    assert time_limit == pytest.approx(soft_time_limit + 30)
+
+
+@pytest.mark.django_db
+def test_with_measurements(exchange):
+    """Test time limits are based on measured throughput."""
+
+    # 200 users per second per attempt and 0.01 seconds per previous pair.
+    baker.make(
+        "af_gang_mail.DrawRun",
+        exchange=exchange,
+        num_participants=500,
+        num_previous_pairs=100,
+        attempts=[[1, 2.0], [0, 3.0]],
+        load_seconds=1.0,
+        started=now(),
+        finished=now(),
+    )
+
+    soft_time_limit, time_limit = tasks._calculate_draw_exchange_time_limits(
+        exchange, max_attempts=10, processes=2
+    )
+    assert soft_time_limit == pytest.approx((200 * 0.01 + 1000 * 5 / 200) * 2)
+    assert time_limit == pytest.approx(soft_time_limit + 30)
+
+
+@pytest.mark.django_db
+def test_minimum(exchange):
+    """Test time limits are never less than the configured time limits."""
+
+    baker.make(
+        "af_gang_mail.DrawRun",
+        exchange=exchange,
+        num_participants=500,
+        num_previous_pairs=100,
+        attempts=[[0, 0.001]],
+        load_seconds=0.001,
+        started=now(),
+        finished=now(),
+    )
+
+    assert tasks._calculate_draw_exchange_time_limits(exchange) == (30, 60)
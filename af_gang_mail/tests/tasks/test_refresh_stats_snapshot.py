@@ -0,0 +1,17 @@
+"""Test refreshing the stats snapshot."""
+
+import pytest
+from model_bakery import baker
+
+from af_gang_mail import models, tasks
+
+
+@pytest.mark.django_db
+def test_refresh_stats_snapshot():
+    """Test a new snapshot replaces older ones."""
+
+    baker.make("af_gang_mail.User", _quantity=3)
+    tasks.refresh_stats_snapshot()
+    tasks.refresh_stats_snapshot()
+
+    assert models.StatsSnapshot.objects.get().users == 3
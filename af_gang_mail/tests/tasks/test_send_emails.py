@@ -0,0 +1,274 @@
+"""Test sending emails to an exchange in batches."""
+
+# pylint: disable=redefined-outer-name
+
+from django.utils.timezone import now
+
+import pytest
+from celery.exceptions import SoftTimeLimitExceeded
+from model_bakery import baker
+
+from af_gang_mail import models, tasks
+
+
+@pytest.fixture(autouse=True)
+def batch_size(settings):
+    settings.EMAIL_BATCH_SIZE = 2
+
+
+@pytest.fixture
+def exchange():
+    return baker.make(
+        "af_gang_mail.Exchange", slug="my-cool-exchange", send_emails=True
+    )
+
+
+@pytest.fixture
+def draws(exchange):
+    """A cycle of five draws in exchange."""
+
+    users = baker.make("af_gang_mail.User", _fill_optional=["email"], _quantity=5)
+    return [
+        baker.make(
+            "af_gang_mail.Draw",
+            exchange=exchange,
+            sender=users[i],
+            recipient=users[(i + 1) % 5],
+        )
+        for i in range(0, 5)
+    ]
+
+
+@pytest.fixture
+def enqueued(monkeypatch):
+    """Batches enqueued instead of being sent."""
+
+    enqueued = []
+    for task in (tasks.send_draw_email_batch, tasks.send_user_in_exchange_email_batch):
+        monkeypatch.setattr(task, "delay", lambda *args: enqueued.append(args))
+
+    return enqueued
+
+
+@pytest.fixture
+def sent_eagerly(monkeypatch):
+    """Batches sent as soon as they're enqueued."""
+
+    for task in (tasks.send_draw_email_batch, tasks.send_user_in_exchange_email_batch):
+        monkeypatch.setattr(task, "delay", task)
+
+
+@pytest.mark.django_db
+def test_draw_emails_are_batched(exchange, draws, enqueued):
+    """Test draw emails are recorded in the ledger and split into batches."""
+
+    tasks.send_draw_emails(exchange.id)
+
+    email_sends = models.EmailSend.objects.filter(exchange=exchange, kind="created")
+    assert {email_send.user_id for email_send in email_sends} == {
+        draw.sender_id for draw in draws
+    }
+    email_send_ids = sorted(email_send.id for email_send in email_sends)
+    assert enqueued == [
+        ("created", email_send_ids[0:2]),
+        ("created", email_send_ids[2:4]),
+        ("created", email_send_ids[4:5]),
+    ]
+
+
+@pytest.mark.django_db
+def test_confirmation_emails_are_batched(exchange, enqueued):
+    """Test confirmation emails are split into batches."""
+
+    users = baker.make("af_gang_mail.User", _quantity=3)
+    exchange.users.add(*users)
+    tasks.send_confirmation_emails(exchange.id)
+
+    assert [kind for kind, _ in enqueued] == ["confirmation", "confirmation"]
+    assert sum(len(batch) for _, batch in enqueued) == 3
+
+
+@pytest.mark.django_db
+def test_no_emails(enqueued):
+    """Test nothing is enqueued for exchanges which don't send emails."""
+
+    exchange = baker.make(
+        "af_gang_mail.Exchange", slug="no-emails-exchange", send_emails=False
+    )
+    tasks.send_draw_emails(exchange.id)
+
+    assert not enqueued
+
+
+@pytest.mark.django_db
+def test_send_draw_emails(exchange, draws, sent_eagerly, mailoutbox):
+    """Test sending draw emails records them as sent."""
+    # pylint: disable=unused-argument
+
+    tasks.send_draw_emails(exchange.id)
+
+    assert sorted(message.to[0] for message in mailoutbox) == sorted(
+        draw.sender.email for draw in draws
+    )
+    for email_send in models.EmailSend.objects.all():
+        assert email_send.status == models.EmailSend.Status.SENT
+        assert email_send.attempts == 1
+        assert email_send.sent
+
+
+@pytest.mark.django_db
+def test_rerun_only_sends_unsent_emails(exchange, draws, sent_eagerly, mailoutbox):
+    """Test rerunning a task doesn't send emails which have already been sent."""
+    # pylint: disable=unused-argument
+
+    models.EmailSend.objects.create(
+        exchange=exchange,
+        user=draws[0].sender,
+        kind="created",
+        status=models.EmailSend.Status.SENT,
+        attempts=1,
+    )
+    tasks.send_draw_emails(exchange.id)
+    tasks.send_draw_emails(exchange.id)
+
+    assert len(mailoutbox) == 4
+    assert draws[0].sender.email not in [message.to[0] for message in mailoutbox]
+
+
+@pytest.mark.django_db
+def test_failed_emails_are_retried(exchange, draws, sent_eagerly, monkeypatch):
+    """Test emails which fail to send are recorded and retried."""
+    # pylint: disable=unused-argument
+
+    def send_messages(self, messages):
+        raise ConnectionError("Nope.")
+
+    monkeypatch.setattr(
+        "django.core.mail.backends.locmem.EmailBackend.send_messages", send_messages
+    )
+    tasks.send_draw_emails(exchange.id)
+    tasks.send_draw_emails(exchange.id)
+
+    for email_send in models.EmailSend.objects.all():
+        assert email_send.status == models.EmailSend.Status.FAILED
+        assert email_send.attempts == 2
+        assert email_send.error == "Nope."
+
+
+@pytest.mark.django_db
+def test_send_draw_email_batch_queries(
+    exchange, draws, enqueued, mailoutbox, django_assert_num_queries
+):
+    """Test a batch records the results of all its messages with one query."""
+
+    tasks.send_draw_emails(exchange.id)
+    email_send_ids = [email_send_id for _, batch in enqueued for email_send_id in batch]
+    assert len(email_send_ids) == len(draws)
+
+    # The current site is cached by the first batch.
+    tasks.send_draw_email_batch("created", email_send_ids[0:1])
+
+    # Savepoint, claim, claim update, release savepoint, draws, senders, and one ledger
+    # update for the sent messages, however many there are.
+    with django_assert_num_queries(7):
+        tasks.send_draw_email_batch("created", email_send_ids[1:])
+
+    assert len(mailoutbox) == 5
+
+
+@pytest.mark.django_db
+def test_interrupted_batch(exchange, draws, enqueued, monkeypatch):
+    """Test an interrupted batch records what it sent and releases the rest."""
+    # pylint: disable=unused-argument
+
+    sent = []
+
+    def send_messages(self, messages):
+        if sent:
+            raise SoftTimeLimitExceeded()
+
+        sent.extend(messages)
+        return len(messages)
+
+    monkeypatch.setattr(
+        "django.core.mail.backends.locmem.EmailBackend.send_messages", send_messages
+    )
+    tasks.send_draw_emails(exchange.id)
+    email_send_ids = [email_send_id for _, batch in enqueued for email_send_id in batch]
+    with pytest.raises(SoftTimeLimitExceeded):
+        tasks.send_draw_email_batch("created", email_send_ids)
+
+    statuses = dict(
+        models.EmailSend.objects.filter(id__in=email_send_ids).values_list(
+            "id", "status"
+        )
+    )
+    assert statuses[email_send_ids[0]] == models.EmailSend.Status.SENT
+    for email_send_id in email_send_ids[1:]:
+        assert statuses[email_send_id] == models.EmailSend.Status.PENDING
+
+
+@pytest.mark.django_db
+def test_provider_templates(exchange, draws, sent_eagerly, mailoutbox, settings):
+    """Test kinds of email with provider templates are sent in batches."""
+    # pylint: disable=unused-argument
+
+    settings.CELERY_EMAIL_BACKEND = "anymail.backends.test.EmailBackend"
+    settings.EMAIL_PROVIDER_TEMPLATES = {"send_reminder": 12}
+    tasks.send_send_reminders(exchange.id)
+
+    # One message for each batch of two draws.
+    assert len(mailoutbox) == 3
+    merge_data = {}
+    for message in mailoutbox:
+        assert message.anymail_test_params["template_id"] == 12
+        assert (
+            message.anymail_test_params["merge_global_data"]["exchange_name"]
+            == exchange.name
+        )
+        merge_data.update(message.anymail_test_params["merge_data"])
+
+    for draw in draws:
+        assert merge_data[draw.sender.email] == {
+            "name": draw.sender.get_full_name(),
+            "recipient_name": draw.recipient.get_full_name(),
+            "sender_name": next(
+                d.sender.get_full_name() for d in draws if d.recipient == draw.sender
+            ),
+        }
+
+    for email_send in models.EmailSend.objects.all():
+        assert email_send.status == models.EmailSend.Status.SENT
+        assert email_send.provider_id
+
+
+@pytest.mark.django_db
+def test_send_reminders_target_unsent_draws(exchange, draws, enqueued):
+    """Test send reminders go to senders who haven't marked their mail as sent."""
+    # pylint: disable=unused-argument
+
+    models.Draw.objects.filter(id__in=[draws[0].id, draws[1].id]).update(sent=now())
+    tasks.send_send_reminders(exchange.id)
+
+    assert set(
+        models.EmailSend.objects.filter(kind="send_reminder").values_list(
+            "user_id", flat=True
+        )
+    ) == {draw.sender_id for draw in draws[2:]}
+
+
+@pytest.mark.django_db
+def test_receive_reminders_target(exchange, draws, enqueued):
+    """Test receive reminders go to senders whose mail isn't marked as received."""
+    # pylint: disable=unused-argument
+
+    models.Draw.objects.filter(id__in=[draw.id for draw in draws]).update(sent=now())
+    # Mail received by draws[1].recipient is marked as received on their own draw.
+    models.Draw.objects.filter(id=draws[2].id).update(received=now())
+    tasks.send_receive_reminders(exchange.id)
+
+    assert set(
+        models.EmailSend.objects.filter(kind="receive_reminder").values_list(
+            "user_id", flat=True
+        )
+    ) == {draw.sender_id for draw in draws if draw != draws[2]}
@@ -0,0 +1,68 @@
+"""Home page query tests."""
+
+# pylint: disable=redefined-outer-name
+
+from datetime import timedelta
+
+from django.utils.timezone import now
+
+import pytest
+from allauth.account.models import EmailAddress
+from model_bakery import baker
+
+from af_gang_mail.models import User
+from af_gang_mail.views import Home
+
+
+@pytest.fixture
+def user():
+    return baker.make(
+        "af_gang_mail.User",
+        emailaddress_set=baker.prepare(EmailAddress, verified=True, _quantity=1),
+        _fill_optional=["first_name", "last_name"],
+    )
+
+
+def make_exchanges(user, num_exchanges):
+    """Make upcoming and active exchanges, with user in some of them."""
+
+    for i in range(num_exchanges):
+        upcoming = baker.make(
+            "af_gang_mail.Exchange",
+            slug=f"upcoming-{ i }",
+            confirmation=now() + timedelta(days=1),
+            drawn=now() + timedelta(days=2 + i),
+        )
+        if i % 2:
+            user.exchanges.add(upcoming, through_defaults={"confirmed": i % 3 == 0})
+
+        active = baker.make(
+            "af_gang_mail.Exchange",
+            slug=f"active-{ i }",
+            drawn=now() - timedelta(days=1 + i),
+            sent=now() + timedelta(days=1),
+        )
+        user.exchanges.add(active)
+        baker.make("af_gang_mail.Draw", exchange=active, sender=user)
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("num_exchanges", [1, 10])
+def test_queries(rf, django_assert_num_queries, user, num_exchanges):
+    """Test the number of queries doesn't depend on the number of exchanges."""
+
+    make_exchanges(user, num_exchanges)
+
+    # Render once to create the page's flatblocks.
+    request = rf.get("/")
+    request.user = user
+    Home.as_view()(request).render()
+
+    request = rf.get("/")
+    request.user = User.objects.get(pk=user.pk)
+    with django_assert_num_queries(11):
+        response = Home.as_view()(request)
+        response.render()
+
+    assert len(response.context_data["active_draws"]) == num_exchanges
+    assert len(response.context_data["upcoming_exchanges"]) == num_exchanges
@@ -7,6 +7,7 @@ from django.core.exceptions import PermissionDenied
 import pytest
 from model_bakery import baker
 
+from af_gang_mail.models import User
 from af_gang_mail.views import Draw
 
 
@@ -60,3 +61,32 @@ def test_not_in_exchange(view, rf, drawn_not_sent_exchange):
     request.user = baker.make("af_gang_mail.User")
     with pytest.raises(PermissionDenied):
         view(request, slug=drawn_not_sent_exchange.slug)
+
+
+@pytest.mark.django_db
+# pylint: disable=too-many-arguments
+def test_queries(
+    view, rf, user, drawn_not_sent_exchange, recipient, django_assert_num_queries
+):
+    """Test the exchange and draws are only looked up once."""
+
+    baker.make(
+        "af_gang_mail.Draw",
+        exchange=drawn_not_sent_exchange,
+        sender=recipient,
+        recipient=user,
+    )
+
+    # Render once to create the page's flatblocks.
+    request = rf.get("/")
+    request.user = user
+    view(request, slug=drawn_not_sent_exchange.slug).render()
+
+    request = rf.get("/")
+    request.user = User.objects.get(pk=user.pk)
+    with django_assert_num_queries(7):
+        response = view(request, slug=drawn_not_sent_exchange.slug)
+        response.render()
+
+    assert response.context_data["sender"] == recipient
+    assert response.context_data["recipient"] == recipient
@@ -0,0 +1,75 @@
+"""Tests for statto view."""
+
+# pylint: disable=redefined-outer-name
+
+from django.contrib.auth.models import Permission
+from django.utils.timezone import now
+
+import pytest
+from model_bakery import baker
+
+from af_gang_mail.models import StatsSnapshot
+from af_gang_mail.views import Statto
+
+
+@pytest.fixture
+def user():
+    user = baker.make("af_gang_mail.User")
+    user.user_permissions.add(Permission.objects.get(codename="statto"))
+    return user
+
+
+@pytest.mark.django_db
+def test_statto(rf, user):
+    """Test stats come from the latest snapshot."""
+
+    StatsSnapshot.objects.create(
+        users=100, percentages=[["Old", 1]], created=now().replace(year=2000)
+    )
+    StatsSnapshot.objects.create(
+        users=200,
+        percentages=[["Users in Cool Exchange", 50], ["Another", 2]],
+        created=now(),
+    )
+
+    request = rf.get("/")
+    request.user = user
+    response = Statto.as_view()(request)
+    response.render()
+
+    assert response.context_data["users"] == 200
+    assert response.context_data["percentages"] == {
+        "Users in Cool Exchange": 50,
+        "Another": 2,
+    }
+    assert b"Users in Cool Exchange (50%)" in response.content
+
+
+@pytest.mark.django_db
+def test_no_snapshot(rf, user):
+    """Test the page works before any stats are computed."""
+
+    request = rf.get("/")
+    request.user = user
+    response = Statto.as_view()(request)
+    response.render()
+
+    assert b"Stats haven't been computed yet." in response.content
+
+
+@pytest.mark.django_db
+def test_trends(rf, user):
+    """Test trends come from daily rollups."""
+
+    exchange = baker.make("af_gang_mail.Exchange", name="Cool Exchange", slug="cool")
+    baker.make(
+        "af_gang_mail.DailyRollup", date=now().date(), exchange=exchange, sent=12
+    )
+
+    request = rf.get("/")
+    request.user = user
+    response = Statto.as_view()(request)
+    response.render()
+
+    assert response.context_data["trends"]["Cool Exchange"][0]["sent"] == 12
+    assert b"Cool Exchange</h2>" in response.content
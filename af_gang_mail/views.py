@@ -1,6 +1,6 @@
 """Views"""
 
-from math import floor
+from datetime import timedelta
 
 from django import http, template, urls
 from django.conf import settings
@@ -9,12 +9,12 @@ from django.contrib.auth.decorators import login_required
 from django.contrib.auth.mixins import LoginRequiredMixin, PermissionRequiredMixin
 from django.contrib.sites.models import Site
 from django.core import mail
-from django.db.models import Q
+from django.db.models import Exists, OuterRef
 from django.forms.models import model_to_dict
 from django.utils import timezone
 from django.utils.decorators import method_decorator
+from django.utils.functional import cached_property
 from django.utils.safestring import mark_safe
-from django.utils.timezone import now
 from django.views.generic import (
     CreateView,
     DeleteView,
@@ -26,7 +26,6 @@ from django.views.generic import (
 )
 from django.views.generic.detail import SingleObjectMixin
 
-import django_countries
 from csp.decorators import csp_exempt
 from django_tables2.paginators import LazyPaginator
 from django_tables2.views import MultiTableMixin, SingleTableView
@@ -44,28 +43,29 @@ class Home(LoginRequiredMixin, TemplateView):
         context_data = super().get_context_data(**kwargs)
 
         user = self.request.user
-        active_draws = []
-        for exchange in user.exchanges.drawn_not_sent():
-            try:
-                draw = user.draws_as_sender.get(exchange=exchange)
-                active_draws.append((exchange, draw.recipient))
-            except models.Draw.DoesNotExist:
-                pass
-
-        upcoming_exchanges = []
-        user_upcoming_exchanges = user.exchanges.all()
-        for exchange in models.Exchange.objects.upcoming():
-            user_confirmed = models.UserInExchange.objects.filter(
-                exchange=exchange,
-                user=user,
-                confirmed=True,
+        active_draws = [
+            (draw.exchange, draw.recipient)
+            for draw in models.Draw.objects.filter(
+                sender=user, exchange__in=user.exchanges.drawn_not_sent()
             )
-            upcoming_exchanges.append(
-                (exchange in user_upcoming_exchanges, exchange, user_confirmed)
+            .select_related("exchange", "recipient")
+            .order_by("exchange__drawn")
+        ]
+
+        users_in_exchange = models.UserInExchange.objects.filter(
+            exchange=OuterRef("pk"), user=user
+        )
+        upcoming_exchanges = [
+            (exchange.user_in_exchange, exchange, exchange.user_confirmed)
+            for exchange in models.Exchange.objects.upcoming().annotate(
+                user_in_exchange=Exists(users_in_exchange),
+                user_confirmed=Exists(users_in_exchange.filter(confirmed=True)),
             )
+        ]
 
+        user_has_verified_email_address = user.has_verified_email_address()
         user_eligible_for_draws = (
-            user.has_verified_email_address() and not user.get_full_name()
+            user_has_verified_email_address and not user.get_full_name()
         )
 
         context_data.update(
@@ -74,6 +74,7 @@ class Home(LoginRequiredMixin, TemplateView):
                 "active_draws": active_draws,
                 "upcoming_exchanges": upcoming_exchanges,
                 "user_eligible_for_draws": user_eligible_for_draws,
+                "user_has_verified_email_address": user_has_verified_email_address,
                 "user_exchanges": user.exchanges.order_by("-drawn").all(),
                 "now": timezone.now(),
             }
@@ -149,20 +150,56 @@ class Draw(LoginRequiredMixin, PermissionRequiredMixin, DetailView):
     template_name = "af_gang_mail/draw.html"
     context_object_name = "exchange"
 
+    @cached_property
+    def exchange(self):
+        return super().get_object()
+
+    @cached_property
+    def draw(self):
+        """The user's draw, or None if they weren't drawn."""
+
+        draw = (
+            models.Draw.objects.filter(exchange=self.exchange, sender=self.request.user)
+            .select_related("sender", "recipient")
+            .first()
+        )
+        if draw:
+            draw.exchange = self.exchange
+
+        return draw
+
+    @cached_property
+    def draw_as_recipient(self):
+        """The draw of the user as a recipient, or None if nobody drew them."""
+
+        draw = (
+            models.Draw.objects.filter(
+                exchange=self.exchange, recipient=self.request.user
+            )
+            .select_related("sender", "recipient")
+            .first()
+        )
+        if draw:
+            draw.exchange = self.exchange
+
+        return draw
+
+    def get_object(self, queryset=None):
+        if queryset is None:
+            return self.exchange
+
+        return super().get_object(queryset)
+
     def has_permission(self):
-        return models.Draw.objects.filter(
-            exchange=self.get_object(), sender=self.request.user
-        ).exists()
+        return self.draw is not None
 
     def get_draw(self):
-        return models.Draw.objects.get(
-            exchange=self.get_object(), sender=self.request.user
-        )
+        return self.draw
 
     def get_context_data(self, **kwargs):
         context_data = super().get_context_data(**kwargs)
-        draw = self.get_draw()
-        context_data.update(draw.get_context_data())
+        sender = self.draw_as_recipient.sender if self.draw_as_recipient else None
+        context_data.update(self.draw.get_context_data(sender=sender))
         return context_data
 
 
@@ -259,7 +296,7 @@ class MailSent(FormView, Draw):
         return msg
 
     def get_success_url(self):
-        return urls.reverse("draw", kwargs={"slug": self.get_draw().exchange.slug})
+        return urls.reverse("draw", kwargs={"slug": self.exchange.slug})
 
 
 class MailReceived(FormView, Draw):
@@ -269,9 +306,9 @@ class MailReceived(FormView, Draw):
     template_name = "af_gang_mail/draw-received.html"
 
     def form_valid(self, form):
-        draw_as_recipient = models.Draw.objects.get(
-            exchange=self.get_object(), recipient=self.request.user
-        )
+        draw_as_recipient = self.draw_as_recipient
+        if draw_as_recipient is None:
+            raise http.Http404("Nobody drew you in this exchange.")
 
         connection = mail.get_connection()
         connection.send_messages(
@@ -333,7 +370,7 @@ class MailReceived(FormView, Draw):
         return msg
 
     def get_success_url(self):
-        return urls.reverse("draw", kwargs={"slug": self.get_draw().exchange.slug})
+        return urls.reverse("draw", kwargs={"slug": self.exchange.slug})
 
 
 class Landing(TemplateView):
@@ -602,101 +639,19 @@ class Statto(LoginRequiredMixin, PermissionRequiredMixin, TemplateView):
     template_name = "af_gang_mail/statto.html"
     permission_required = "af_gang_mail.statto"
 
-    def _get_user_percentages(self):  # pylint: disable=no-self-use
-        """User percentages."""
-
-        users = models.User.objects.count()
-        user_stats = {
-            "Users with Verified Email": models.User.objects.filter(
-                emailaddress__verified=True
-            ).count(),
-            "Users with First Name": models.User.objects.exclude(first_name="").count(),
-            "Users with Last Name": models.User.objects.exclude(last_name="").count(),
-            "Users with Address Line 1": models.User.objects.exclude(
-                address_line_1=""
-            ).count(),
-            "Users with Address Line 2": models.User.objects.exclude(
-                address_line_2=""
-            ).count(),
-            "Users with Address City": models.User.objects.exclude(
-                address_city=""
-            ).count(),
-            "Users with Address State": models.User.objects.exclude(
-                address_state=""
-            ).count(),
-            "Users with Address Postcode": models.User.objects.exclude(
-                address_postcode=""
-            ).count(),
-            "Users with Address Country": models.User.objects.exclude(
-                address_country=""
-            ).count(),
-        }
-
-        countries = models.User.objects.distinct("address_country").values_list(
-            "address_country", flat=True
-        )
-        country_names = dict(django_countries.countries)
-        for country in countries:
-            try:
-                country_name = country_names[country]
-            except KeyError:
-                country_name = f"Unkown Country ({ country })"
-
-            user_stats[f"Users in { country_name }"] = models.User.objects.filter(
-                address_country=country
-            ).count()
-
-        return {k: floor(n / users * 100) for k, n in user_stats.items()}
-
-    def _get_exchange_percentages(self):  # pylint: disable=no-self-use
-        """Exchange percentages."""
-
-        percentages = {}
-
-        users = models.User.objects.count()
-        for exchange in models.Exchange.objects.filter(received__gt=now()):
-            users_in_exchange = exchange.users.count()
-            confirmed_users_in_exchange = models.UserInExchange.objects.filter(
-                exchange=exchange, confirmed=True
-            ).count()
-            eligible_users_in_exchange = exchange.users.eligible_for_draw().count()
-            percentages[f"Users in { exchange.name }"] = floor(
-                users_in_exchange / users * 100
-            )
-            try:
-                percentages[f"Eligible Users in { exchange.name }"] = floor(
-                    eligible_users_in_exchange / users_in_exchange * 100
-                )
-                percentages[f"Users confirmed for { exchange.name }"] = floor(
-                    confirmed_users_in_exchange / users_in_exchange * 100
-                )
-                percentages[
-                    f"Users ineligible due to unverified email in { exchange.name }"
-                ] = floor(
-                    exchange.users.filter(emailaddress__verified=False).count()
-                    / users_in_exchange
-                    * 100
-                )
-                percentages[
-                    f"Users ineligible due to missing name in { exchange.name }"
-                ] = floor(
-                    exchange.users.filter(Q(first_name="") & Q(last_name="")).count()
-                    / users_in_exchange
-                    * 100
-                )
-
-            except ZeroDivisionError:
-                pass
-
-        return percentages
-
     def get_context_data(self, **kwargs):
         context_data = super().get_context_data(**kwargs)
 
-        context_data["percentages"] = dict(
-            **self._get_user_percentages(), **self._get_exchange_percentages()
+        # Stats are computed periodically by tasks.refresh_stats_snapshot.
+        snapshot = models.StatsSnapshot.objects.order_by("-created").first()
+        context_data["snapshot"] = snapshot
+        if snapshot:
+            context_data["percentages"] = dict(snapshot.percentages)
+            context_data["users"] = snapshot.users
+
+        context_data["trends"] = models.DailyRollup.objects.trends(
+            since=timezone.now().date() - timedelta(days=settings.STATTO_TREND_DAYS)
         )
-        context_data["users"] = models.User.objects.count()
 
         return context_data
 